@@ -1,8 +1,17 @@
 # core/admin.py
 from django.contrib import admin
 from django.apps import apps
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
 from . import models
 
+
+def _has_file(field_name):
+    """Boolean expression that is True when a nullable FileField holds a file."""
+    return ExpressionWrapper(
+        Q(**{f'{field_name}__isnull': False}) & ~Q(**{field_name: ''}),
+        output_field=BooleanField(),
+    )
+
 # Optional: restrict non-superuser admins to their tenant's objects.
 # Uncomment and adjust if you want tenant-scoped admin list views.
 #
@@ -32,11 +41,15 @@ class GLJournalLineInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('line_number',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('account', 'cost_center')
+
 
 @admin.register(models.GLJournal)
 class GLJournalAdmin(admin.ModelAdmin):
     inlines = [GLJournalLineInline]
     list_display = ('journal_number', 'tenant', 'posting_date', 'status', 'total_debit', 'total_credit')
+    list_select_related = ('tenant',)
     list_filter = ('status', 'posting_date', 'tenant')
     search_fields = ('journal_number', 'reference')
 
@@ -44,6 +57,7 @@ class GLJournalAdmin(admin.ModelAdmin):
 @admin.register(models.WorkOrder)
 class WorkOrderAdmin(admin.ModelAdmin):
     list_display = ('wo_number', 'tenant', 'product', 'status', 'due_date', 'priority', 'completion_percent')
+    list_select_related = ('tenant', 'product')
     list_filter = ('status', 'priority', 'due_date', 'tenant')
     search_fields = ('wo_number', 'product__sku', 'product__product_name')
     readonly_fields = ('quantity_completed', 'quantity_scrapped')
@@ -68,22 +82,35 @@ class ProductImageInline(admin.TabularInline):
     image_preview.allow_tags = True
     image_preview.short_description = 'Preview'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
 @admin.register(models.Product)
 class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductImageInline]  # Add this line
     list_display = ('sku', 'product_name', 'tenant', 'product_type', 'uom', 'standard_cost', 'has_image', 'additional_images_count')
+    list_select_related = ('tenant',)
     list_filter = ('product_type', 'uom', 'tenant')
     search_fields = ('sku', 'product_name', 'category')
     readonly_fields = ('image_preview',)
 
+    def get_queryset(self, request):
+        # Count images in the changelist query instead of one COUNT per row
+        return super().get_queryset(request).annotate(
+            _addl_images=Count('additional_images'),
+            _has_primary=_has_file('primary_image'),
+        )
+
     def has_image(self, obj):
-        return bool(obj.primary_image)
+        return obj._has_primary
     has_image.boolean = True
     has_image.short_description = 'Has Primary Image'
+    has_image.admin_order_field = '_has_primary'
 
     def additional_images_count(self, obj):
-        return obj.additional_images.count()
+        return obj._addl_images
     additional_images_count.short_description = 'Additional Images'
+    additional_images_count.admin_order_field = '_addl_images'
 
     def image_preview(self, obj):
         if obj.primary_image:
@@ -96,6 +123,7 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(models.ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ('product', 'caption', 'display_order', 'image_preview', 'created_at')
+    list_select_related = ('product',)
     list_filter = ('product__tenant', 'product')
     search_fields = ('product__sku', 'product__product_name', 'caption')
     readonly_fields = ('image_preview',)
@@ -119,6 +147,8 @@ class TenantAdmin(admin.ModelAdmin):
 @admin.register(models.TenantUser)
 class TenantUserAdmin(admin.ModelAdmin):
     list_display = ('tenant', 'user', 'role', 'is_active', 'created_at')
+    list_select_related = ('tenant', 'user')
+    raw_id_fields = ('tenant', 'user')
     list_filter = ('role', 'is_active', 'tenant')
     search_fields = ('user__username', 'tenant__company_name')
 
@@ -126,6 +156,7 @@ class TenantUserAdmin(admin.ModelAdmin):
 @admin.register(models.Employee)
 class EmployeeAdmin(admin.ModelAdmin):
     list_display = ('employee_code', 'full_name', 'tenant', 'department', 'designation', 'hire_date')
+    list_select_related = ('tenant',)
     search_fields = ('employee_code', 'full_name', 'department')
 
 
@@ -145,10 +176,15 @@ class EmployeeDocumentInline(admin.TabularInline):
     document_preview.allow_tags = True
     document_preview.short_description = 'Preview'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('employee')
+
 
 @admin.register(models.EmployeeDocument)
 class EmployeeDocumentAdmin(admin.ModelAdmin):
     list_display = ('employee', 'document_type', 'document_name', 'expiry_date', 'created_at')
+    list_select_related = ('employee',)
+    raw_id_fields = ('tenant', 'employee')
     list_filter = ('document_type', 'employee__tenant')
     search_fields = ('employee__employee_code', 'employee__full_name', 'document_name')
     readonly_fields = ('document_preview',)
@@ -168,6 +204,8 @@ class EmployeeDocumentAdmin(admin.ModelAdmin):
 @admin.register(models.ProductionEntry)
 class ProductionEntryAdmin(admin.ModelAdmin):
     list_display = ('work_order', 'entry_datetime', 'equipment', 'operator', 'quantity_produced', 'quantity_rejected')
+    list_select_related = ('work_order__product', 'equipment', 'operator', 'tenant')
+    raw_id_fields = ('tenant', 'work_order', 'equipment', 'operator')
     list_filter = ('shift', 'entry_datetime', 'tenant')
     search_fields = ('work_order__wo_number',)
 
@@ -175,12 +213,15 @@ class ProductionEntryAdmin(admin.ModelAdmin):
 @admin.register(models.Warehouse)
 class WarehouseAdmin(admin.ModelAdmin):
     list_display = ('warehouse_code', 'warehouse_name', 'tenant', 'location', 'manager')
+    list_select_related = ('tenant', 'manager')
     search_fields = ('warehouse_code', 'warehouse_name')
 
 
 @admin.register(models.StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
     list_display = ('movement_number', 'movement_type', 'product', 'warehouse', 'quantity', 'movement_date', 'tenant')
+    list_select_related = ('tenant', 'product', 'warehouse')
+    raw_id_fields = ('tenant', 'product', 'warehouse')
     list_filter = ('movement_type', 'movement_date', 'tenant')
     search_fields = ('movement_number', 'reference_doc')
 
@@ -188,12 +229,14 @@ class StockMovementAdmin(admin.ModelAdmin):
 @admin.register(models.CostCenter)
 class CostCenterAdmin(admin.ModelAdmin):
     list_display = ('cost_center_code', 'name', 'tenant', 'manager')
+    list_select_related = ('tenant', 'manager')
     search_fields = ('cost_center_code', 'name')
 
 
 @admin.register(models.ChartOfAccounts)
 class ChartOfAccountsAdmin(admin.ModelAdmin):
     list_display = ('account_code', 'account_name', 'account_type', 'tenant', 'parent_account')
+    list_select_related = ('tenant', 'parent_account')
     list_filter = ('account_type', 'tenant')
     search_fields = ('account_code', 'account_name')
 
@@ -201,6 +244,7 @@ class ChartOfAccountsAdmin(admin.ModelAdmin):
 @admin.register(models.Equipment)
 class EquipmentAdmin(admin.ModelAdmin):
     list_display = ('equipment_code', 'equipment_name', 'tenant', 'location', 'acquisition_date')
+    list_select_related = ('tenant',)
     list_filter = ('tenant',)
     search_fields = ('equipment_code', 'equipment_name')
 
@@ -208,6 +252,7 @@ class EquipmentAdmin(admin.ModelAdmin):
 @admin.register(models.Party)
 class PartyAdmin(admin.ModelAdmin):
     list_display = ('party_code', 'party_type', 'legal_name', 'display_name', 'tenant', 'gstin')
+    list_select_related = ('tenant',)
     list_filter = ('party_type', 'tenant')
     search_fields = ('party_code', 'legal_name', 'display_name')
 
@@ -216,20 +261,30 @@ class PurchaseOrderLineInline(admin.TabularInline):
     model = models.PurchaseOrderLine
     extra = 1
     readonly_fields = ('subtotal',)
+    raw_id_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 
 @admin.register(models.PurchaseOrder)
 class PurchaseOrderAdmin(admin.ModelAdmin):
     inlines = [PurchaseOrderLineInline]
     list_display = ('po_number', 'supplier', 'order_date', 'status', 'amount', 'has_document')
+    list_select_related = ('supplier', 'tenant')
+    raw_id_fields = ('tenant', 'supplier')
     list_filter = ('status', 'order_date', 'tenant')
     search_fields = ('po_number', 'supplier__display_name')
     readonly_fields = ('document_preview',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_has_document=_has_file('po_document'))
+
     def has_document(self, obj):
-        return bool(obj.po_document)
+        return obj._has_document
     has_document.boolean = True
     has_document.short_description = 'Has Document'
+    has_document.admin_order_field = '_has_document'
 
     def document_preview(self, obj):
         if obj.po_document:
@@ -242,14 +297,19 @@ class PurchaseOrderAdmin(admin.ModelAdmin):
 @admin.register(models.CustomerInvoice)
 class CustomerInvoiceAdmin(admin.ModelAdmin):
     list_display = ('invoice_number', 'customer', 'invoice_date', 'due_date', 'invoice_amount', 'status', 'has_document')
+    list_select_related = ('customer', 'tenant')
     list_filter = ('status', 'invoice_date', 'tenant')
     search_fields = ('invoice_number', 'customer__display_name')
     readonly_fields = ('document_preview',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_has_document=_has_file('invoice_document'))
+
     def has_document(self, obj):
-        return bool(obj.invoice_document)
+        return obj._has_document
     has_document.boolean = True
     has_document.short_description = 'Has Document'
+    has_document.admin_order_field = '_has_document'
 
     def document_preview(self, obj):
         if obj.invoice_document:
@@ -262,14 +322,19 @@ class CustomerInvoiceAdmin(admin.ModelAdmin):
 @admin.register(models.CustomerPurchaseOrder)
 class CustomerPurchaseOrderAdmin(admin.ModelAdmin):
     list_display = ('po_number', 'customer', 'po_date', 'status', 'po_amount', 'has_document')
+    list_select_related = ('customer', 'tenant')
     list_filter = ('status', 'po_date', 'tenant')
     search_fields = ('po_number', 'customer__display_name')
     readonly_fields = ('document_preview',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_has_document=_has_file('po_document'))
+
     def has_document(self, obj):
-        return bool(obj.po_document)
+        return obj._has_document
     has_document.boolean = True
     has_document.short_description = 'Has Document'
+    has_document.admin_order_field = '_has_document'
 
     def document_preview(self, obj):
         if obj.po_document:
@@ -282,20 +347,30 @@ class CustomerPurchaseOrderAdmin(admin.ModelAdmin):
 class PaymentAdviceInvoiceInline(admin.TabularInline):
     model = models.PaymentAdviceInvoice
     extra = 1
+    raw_id_fields = ('invoice',)
+
+    def get_queryset(self, request):
+        # Invoice.__str__ renders the customer name
+        return super().get_queryset(request).select_related('invoice__customer')
 
 
 @admin.register(models.PaymentAdvice)
 class PaymentAdviceAdmin(admin.ModelAdmin):
     inlines = [PaymentAdviceInvoiceInline]
     list_display = ('advice_number', 'customer', 'advice_date', 'total_payment_amount', 'has_document')
+    list_select_related = ('customer', 'tenant')
     list_filter = ('advice_date', 'tenant')
     search_fields = ('advice_number', 'customer__display_name')
     readonly_fields = ('document_preview',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_has_document=_has_file('advice_document'))
+
     def has_document(self, obj):
-        return bool(obj.advice_document)
+        return obj._has_document
     has_document.boolean = True
     has_document.short_description = 'Has Document'
+    has_document.admin_order_field = '_has_document'
 
     def document_preview(self, obj):
         if obj.advice_document:
@@ -312,6 +387,7 @@ class PaymentAdviceAdmin(admin.ModelAdmin):
 @admin.register(models.AIQueryLog)
 class AIQueryLogAdmin(admin.ModelAdmin):
     list_display = ('created_at', 'tenant', 'user_query', 'was_successful', 'execution_time_ms')
+    list_select_related = ('tenant',)
     list_filter = ('was_successful', 'tenant')
     search_fields = ('user_query',)
     readonly_fields = ('user_query', 'generated_sql', 'execution_time_ms', 'result_rows', 'was_successful', 'error_message')
@@ -320,6 +396,7 @@ class AIQueryLogAdmin(admin.ModelAdmin):
 @admin.register(models.AutomationRule)
 class AutomationRuleAdmin(admin.ModelAdmin):
     list_display = ('rule_name', 'trigger_type', 'is_enabled', 'last_executed', 'tenant')
+    list_select_related = ('tenant',)
     list_filter = ('trigger_type', 'is_enabled', 'tenant')
     search_fields = ('rule_name',)
 
@@ -327,6 +404,7 @@ class AutomationRuleAdmin(admin.ModelAdmin):
 @admin.register(models.TenantEmailConfig)
 class TenantEmailConfigAdmin(admin.ModelAdmin):
     list_display = ('tenant', 'weekly_report_enabled', 'send_day', 'send_time')
+    list_select_related = ('tenant',)
     list_filter = ('weekly_report_enabled', 'send_day', 'tenant')
     search_fields = ('tenant__company_name',)
 
@@ -334,6 +412,7 @@ class TenantEmailConfigAdmin(admin.ModelAdmin):
 @admin.register(models.GLJournalArchive)
 class GLJournalArchiveAdmin(admin.ModelAdmin):
     list_display = ('journal_number', 'posting_date', 'tenant', 'total_debit', 'total_credit', 'status', 'archived_at')
+    list_select_related = ('tenant',)
     list_filter = ('status', 'posting_date', 'tenant')
     search_fields = ('journal_number', 'reference')
     readonly_fields = ('journal_number', 'posting_date', 'reference', 'narration', 'total_debit', 'total_credit', 'status', 'original_id', 'archived_at')
@@ -342,6 +421,7 @@ class GLJournalArchiveAdmin(admin.ModelAdmin):
 @admin.register(models.GLJournalLineArchive)
 class GLJournalLineArchiveAdmin(admin.ModelAdmin):
     list_display = ('journal', 'line_number', 'account_code', 'debit_amount', 'credit_amount')
-    list_filter = ('journal__tenant',)
+    list_select_related = ('journal',)
+    list_filter = ('tenant',)
     search_fields = ('journal__journal_number', 'account_code')
     readonly_fields = ('journal', 'line_number', 'account_code', 'cost_center_code', 'debit_amount', 'credit_amount', 'description', 'original_id')
\ No newline at end of file
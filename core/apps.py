@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        ai_settings = getattr(settings, 'AI_SETTINGS', None) or {}
+        if ai_settings.get('SEMANTIC_CACHE_ENABLED'):
+            from .enhanced_ai_engine import load_semantic_cache_model
+            load_semantic_cache_model()
@@ -2,31 +2,70 @@
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.db.models import Sum, Avg, Count, Q, F, Case, When, Window
-from django.utils import timezone
-from datetime import datetime, timedelta
+from django.db.models import Sum, Avg, Count, Q, F, Case, When, Window, CharField, DecimalField, Value
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+from django.core.cache import cache
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from functools import lru_cache
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
 from rest_framework.decorators import action
+import hashlib
+import heapq
 import logging
+import math
+import time
+import numpy as np
+from django.http import HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 from rest_framework import status
 
 from .models import (
-    WorkOrder, ProductionEntry, Equipment, Employee, Product,
+    WorkOrder, ProductionEntry, Equipment, Product,
     StockMovement, GLJournalLine, ChartOfAccounts, CostCenter
 )
-from .middleware import get_current_tenant
+from .middleware import get_current_tenant, get_request_now
 from .utils import (
-    generate_reorder_suggestions, calculate_inventory_valuation,
+    generate_reorder_suggestions, cached_inventory_valuation,
     get_production_efficiency_trends, calculate_cost_center_performance, calculate_material_consumption, detect_production_anomalies,
-    generate_financial_summary, create_automated_gl_entry, calculate_oee, 
-    get_dashboard_alerts
+    generate_financial_summary, create_automated_gl_entry, calculate_oee_bulk,
+    get_dashboard_alerts, inventory_valuation_cache_key, INVENTORY_VALUATION_CACHE_TTL,
+    analysis_cache_key, ANALYSIS_CACHE_TTL, datetime_span, stock_cache_version
 )
 
 logger = logging.getLogger(__name__)
 
 # ===== HELPER FUNCTIONS =====
 
+def _etag(state_key):
+    """Strong ETag for a response fully determined by a versioned (shared-cache) key"""
+    return '"%s"' % hashlib.md5(state_key.encode(), usedforsecurity=False).hexdigest()
+
+def _not_modified(request, etag):
+    """304 for a poll that already holds this ETag, else None; checked before any query runs"""
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return None
+
+def _cached_dashboard_section(section_name, builder, tenant, start_date, end_date, **kwargs):
+    """Serve a fact-table dashboard section from the versioned analysis cache"""
+    cache_key = analysis_cache_key(section_name, tenant.id, start_date, end_date)
+    section = cache.get(cache_key)
+    if section is None:
+        section = builder(tenant, start_date, end_date, **kwargs)
+        cache.set(cache_key, section, ANALYSIS_CACHE_TTL)
+    return section
+
+@lru_cache(maxsize=1024)
+def parse_ymd(value):
+    """Parse a YYYY-MM-DD query param; dashboards repeat the same few dates, so memoize"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
 def parse_date_range(request, default_days=30):
     """Parse start_date and end_date from request or use default"""
     start_date_param = request.query_params.get('start_date')
@@ -34,12 +73,12 @@ def parse_date_range(request, default_days=30):
     
     try:
         if end_date_param:
-            end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
+            end_date = parse_ymd(end_date_param)
         else:
-            end_date = timezone.now().date()
+            end_date = get_request_now().date()
             
         if start_date_param:
-            start_date = datetime.strptime(start_date_param, '%Y-%m-%d').date()
+            start_date = parse_ymd(start_date_param)
         else:
             start_date = end_date - timedelta(days=default_days)
             
@@ -51,16 +90,6 @@ def parse_date_range(request, default_days=30):
     except ValueError:
         return None, None
 
-def safe_aggregate(queryset, field, operation=Sum, default=0):
-    """Safely aggregate field values with proper type conversion"""
-    result = queryset.aggregate(value=operation(field))['value']
-    if result is None:
-        return default
-    try:
-        return float(result)
-    except (TypeError, ValueError):
-        return default
-
 # ===== PRODUCTION PLANNING =====
 
 @api_view(['GET'])
@@ -72,41 +101,49 @@ def production_schedule_suggestions(request):
     
     days_ahead = int(request.query_params.get('days_ahead', 7))
     
-    # Get pending work orders
-    pending_orders = WorkOrder.objects.filter(
+    # Current utilization window is the same for every machine
+    start_date, end_date = parse_date_range(request, 7)
+    if start_date is None:
+        return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
+    total_hours = ((end_date - start_date).days + 1) * 24
+    
+    # Get pending work orders (only the columns the schedule reads)
+    pending_orders = list(WorkOrder.objects.filter(
         tenant=tenant,
         status__in=['planned', 'released'],
         is_active=True
-    ).select_related('product', 'cost_center').order_by('due_date', 'priority')
+    ).select_related('product').only(
+        'wo_number', 'quantity_planned', 'due_date', 'priority', 'product', 'product__sku'
+    ).order_by('due_date', 'priority'))
+    
+    # Urgency doesn't depend on the machine, so rank the backlog once
+    today = get_request_now().date()
+    ranked_orders = sorted(
+        ((calculate_urgency_score(wo, today), wo) for wo in pending_orders),
+        key=lambda pair: (pair[0], pair[1].due_date),
+        reverse=True
+    )[:5]
     
     # Get equipment capacity and utilization
-    equipment_list = Equipment.objects.filter(tenant=tenant, is_active=True)
+    equipment_list = list(Equipment.objects.filter(tenant=tenant, is_active=True))
+    entries_by_equipment = dict(
+        ProductionEntry.objects.filter(
+            tenant=tenant,
+            equipment__in=equipment_list,
+            **datetime_span('entry_datetime', start_date, end_date)
+        ).order_by().values_list('equipment_id').annotate(Count('id'))
+    )
     equipment_schedule = []
     
     for equipment in equipment_list:
-        # Calculate current week utilization with custom date range
-        start_date, end_date = parse_date_range(request, 7)
-        if start_date is None:
-            return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
-            
-        recent_entries = ProductionEntry.objects.filter(
-            tenant=tenant,
-            equipment=equipment,
-            entry_datetime__date__range=[start_date, end_date]
-        ).count()
-        
-        # Calculate total hours in the period
-        total_hours = ((end_date - start_date).days + 1) * 24
+        recent_entries = entries_by_equipment.get(equipment.id, 0)
         utilization_pct = (recent_entries / max(total_hours, 1)) * 100
         
-        # Find suitable work orders for this equipment
+        # Top work orders for this equipment with their estimated run time
         suitable_orders = []
-        for wo in pending_orders:
-            # Calculate estimated production time
-            if equipment.capacity_per_hour > 0:
+        if equipment.capacity_per_hour > 0:
+            for urgency_score, wo in ranked_orders:
                 estimated_hours = wo.quantity_planned / equipment.capacity_per_hour
-                urgency_score = calculate_urgency_score(wo)
-                
                 suitable_orders.append({
                     'wo_number': wo.wo_number,
                     'product_sku': wo.product.sku,
@@ -117,25 +154,22 @@ def production_schedule_suggestions(request):
                     'priority': wo.priority
                 })
         
-        # Sort by urgency and due date
-        suitable_orders.sort(key=lambda x: (x['urgency_score'], x['due_date']), reverse=True)
-        
         equipment_schedule.append({
             'equipment_id': equipment.id,
             'equipment_code': equipment.equipment_code,
             'equipment_name': equipment.equipment_name,
             'capacity_per_hour': equipment.capacity_per_hour,
             'current_utilization_pct': round(utilization_pct, 2),
-            'recommended_orders': suitable_orders[:5],
+            'recommended_orders': suitable_orders,
             'available_capacity_pct': max(0, 100 - utilization_pct),
             'period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
         })
     
     return Response({
-        'schedule_date': timezone.now().date(),
+        'schedule_date': get_request_now().date(),
         'planning_horizon_days': days_ahead,
         'equipment_schedule': equipment_schedule,
-        'total_pending_orders': pending_orders.count(),
+        'total_pending_orders': len(pending_orders),
         'bottleneck_equipment': get_bottleneck_equipment(equipment_schedule)
     })
 
@@ -151,34 +185,39 @@ def capacity_analysis(request):
     if start_date is None:
         return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
     
+    cache_key = analysis_cache_key('capacity_analysis', tenant.id, start_date, end_date)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Response(cached)
+    
     analysis_period = (end_date - start_date).days
     
+    # Future demand (pending work orders) is the same for every machine
+    pending_demand = WorkOrder.objects.filter(
+        tenant=tenant,
+        status__in=['planned', 'released']
+    ).aggregate(Sum('quantity_planned'))['quantity_planned__sum'] or 0
+    
     equipment_analysis = []
-    equipment_list = Equipment.objects.filter(tenant=tenant, is_active=True)
+    # Historical utilization per machine, annotated in the equipment query
+    in_period = Q(
+        productionentry__tenant=tenant,
+        **datetime_span('productionentry__entry_datetime', start_date, end_date)
+    )
+    equipment_list = Equipment.objects.filter(tenant=tenant, is_active=True).annotate(
+        hours_used=Count('productionentry', filter=in_period),
+        produced=Sum('productionentry__quantity_produced', filter=in_period)
+    )
     
     for equipment in equipment_list:
-        # Historical utilization
-        production_entries = ProductionEntry.objects.filter(
-            tenant=tenant,
-            equipment=equipment,
-            entry_datetime__date__range=[start_date, end_date]
-        )
-        
         total_hours_available = analysis_period * 24  # Assuming 24/7 availability
-        total_hours_used = production_entries.count()
-        actual_production = safe_aggregate(production_entries, 'quantity_produced', Sum, 0)
+        total_hours_used = equipment.hours_used
+        actual_production = float(equipment.produced or 0)
         
         theoretical_capacity = equipment.capacity_per_hour * total_hours_available
         capacity_utilization = (total_hours_used / max(total_hours_available, 1)) * 100
         efficiency_rate = (actual_production / max(theoretical_capacity, 1)) * 100
         
-        # Future demand (pending work orders)
-        pending_demand = WorkOrder.objects.filter(
-            tenant=tenant,
-            status__in=['planned', 'released'],
-            product__in=Product.objects.filter(tenant=tenant)
-        ).aggregate(Sum('quantity_planned'))['quantity_planned__sum'] or 0
-        
         estimated_hours_needed = pending_demand / equipment.capacity_per_hour if equipment.capacity_per_hour > 0 else 0
         
         equipment_analysis.append({
@@ -194,11 +233,13 @@ def capacity_analysis(request):
             'period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
         })
     
-    return Response({
+    payload = {
         'analysis_period_days': analysis_period,
         'equipment_analysis': equipment_analysis,
         'overall_capacity_utilization': sum(e['utilization_pct'] for e in equipment_analysis) / max(len(equipment_analysis), 1)
-    })
+    }
+    cache.set(cache_key, payload, ANALYSIS_CACHE_TTL)
+    return Response(payload)
 
 # ===== INVENTORY MANAGEMENT =====
 
@@ -238,15 +279,20 @@ def inventory_valuation(request):
     if not tenant:
         return Response({'error': 'No tenant context'}, status=400)
 
-    valuation_date = request.query_params.get('as_of_date', timezone.now().date())
+    valuation_date = request.query_params.get('as_of_date', get_request_now().date())
     if isinstance(valuation_date, str):
         try:
-            valuation_date = datetime.strptime(valuation_date, '%Y-%m-%d').date()
+            valuation_date = parse_ymd(valuation_date)
         except ValueError:
             return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
 
+    cache_key = inventory_valuation_cache_key(tenant.id, valuation_date)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Response(cached)
+
     # call util
-    valuation_data_raw = calculate_inventory_valuation(tenant, valuation_date)
+    valuation_data_raw = cached_inventory_valuation(tenant, valuation_date)
 
     # If util returned the wrapper {'total_inventory_value': X, 'details': {...}}, extract details.
     if isinstance(valuation_data_raw, dict) and 'details' in valuation_data_raw and isinstance(valuation_data_raw['details'], dict):
@@ -358,38 +404,40 @@ def inventory_valuation(request):
             'details': f"Returned type: {type(valuation_data_raw).__name__}"
         }, status=500)
 
-    # Now safe to compute summary metrics
-    try:
-        total_value = sum(float(v.get('total_value', 0) or 0) for v in valuation_data.values())
-        total_quantity = sum(float(v.get('quantity', 0) or 0) for v in valuation_data.values())
-    except Exception as e:
-        logger.exception("Error while summarizing valuation_data: %s", e)
-        return Response({'error': 'Failed to summarize valuation data', 'details': str(e)}, status=500)
-
-    # Category-wise breakdown (try best-effort)
+    # Category-wise breakdown (try best-effort); every row above carries float quantity/total_value
+    category_by_sku = dict(
+        Product.objects.filter(tenant=tenant, sku__in=list(valuation_data.keys()))
+        .values_list('sku', 'category')
+    )
     category_breakdown = {}
     for sku, data in valuation_data.items():
-        try:
-            product = Product.objects.get(tenant=tenant, sku=sku)
-            category = product.category or 'Uncategorized'
-        except Product.DoesNotExist:
+        if sku in category_by_sku:
+            category = category_by_sku[sku] or 'Uncategorized'
+        else:
             category = data.get('category') or 'Uncategorized'
 
-        if category not in category_breakdown:
-            category_breakdown[category] = {'value': 0.0, 'quantity': 0.0, 'items': 0}
+        bucket = category_breakdown.get(category)
+        if bucket is None:
+            bucket = category_breakdown[category] = {'value': 0.0, 'quantity': 0.0, 'items': 0}
 
-        category_breakdown[category]['value'] += float(data.get('total_value', 0) or 0)
-        category_breakdown[category]['quantity'] += float(data.get('quantity', 0) or 0)
-        category_breakdown[category]['items'] += 1
+        bucket['value'] += data['total_value']
+        bucket['quantity'] += data['quantity']
+        bucket['items'] += 1
 
-    return Response({
+    # Totals fall out of the per-category sums, no second pass over every SKU
+    total_value = sum(b['value'] for b in category_breakdown.values())
+    total_quantity = sum(b['quantity'] for b in category_breakdown.values())
+
+    payload = {
         'valuation_date': valuation_date,
         'total_inventory_value': total_value,
         'total_quantity': total_quantity,
         'item_count': len(valuation_data),
         'category_breakdown': category_breakdown,
         'detailed_valuation': valuation_data
-    })
+    }
+    cache.set(cache_key, payload, INVENTORY_VALUATION_CACHE_TTL)
+    return Response(payload)
 
 # ===== FINANCIAL ANALYSIS =====
 
@@ -428,7 +476,7 @@ def profit_loss_statement(request):
     start_date, end_date = parse_date_range(request, 30)
     if start_date is None:
         # Default to current month
-        end_date = timezone.now().date()
+        end_date = get_request_now().date()
         start_date = end_date.replace(day=1)
     
     # Get GL entries for the period
@@ -438,24 +486,24 @@ def profit_loss_statement(request):
         journal__posting_date__range=[start_date, end_date]
     ).select_related('account')
     
-    # Aggregate by account type
-    revenue = gl_entries.filter(
-        account__account_type='revenue'
-    ).aggregate(
-        total=Sum(F('credit_amount') - F('debit_amount'))
-    )['total'] or 0
-    
-    cogs = gl_entries.filter(
-        account__account_type='cogs'
-    ).aggregate(
-        total=Sum(F('debit_amount') - F('credit_amount'))
-    )['total'] or 0
-    
-    expenses = gl_entries.filter(
-        account__account_type='expense'
-    ).aggregate(
-        total=Sum(F('debit_amount') - F('credit_amount'))
-    )['total'] or 0
+    # Aggregate by account type in a single pass over the period's lines
+    totals = gl_entries.aggregate(
+        revenue=Sum(Case(
+            When(account__account_type='revenue', then=F('credit_amount') - F('debit_amount')),
+            output_field=DecimalField()
+        )),
+        cogs=Sum(Case(
+            When(account__account_type='cogs', then=F('debit_amount') - F('credit_amount')),
+            output_field=DecimalField()
+        )),
+        expenses=Sum(Case(
+            When(account__account_type='expense', then=F('debit_amount') - F('credit_amount')),
+            output_field=DecimalField()
+        ))
+    )
+    revenue = totals['revenue'] or 0
+    cogs = totals['cogs'] or 0
+    expenses = totals['expenses'] or 0
     
     # Calculate derived figures
     gross_profit = revenue - cogs
@@ -494,30 +542,36 @@ def cost_center_analysis(request):
     if start_date is None:
         return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
     
+    cache_key = analysis_cache_key('cost_center_analysis', tenant.id, start_date, end_date)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Response(cached)
+    
     cost_centers = CostCenter.objects.filter(tenant=tenant, is_active=True)
     analysis_data = []
     
+    # Labor hours and output per cost center in one grouped query (1 entry per hour)
+    labor_stats = {
+        row['operator__cost_center_id']: row
+        for row in ProductionEntry.objects.filter(
+            tenant=tenant,
+            operator__cost_center__in=cost_centers,
+            operator__is_active=True,
+            **datetime_span('entry_datetime', start_date, end_date)
+        ).values('operator__cost_center_id').annotate(
+            hours=Count('id'),
+            production=Sum('quantity_produced')
+        )
+    }
+    
     for cc in cost_centers:
         performance = calculate_cost_center_performance(cc, start_date, end_date)
         
         # Additional metrics
         # Labor efficiency
-        employees_in_cc = Employee.objects.filter(cost_center=cc, is_active=True)
-        total_labor_hours = 0
-        total_production = 0
-        
-        for employee in employees_in_cc:
-            production_entries = ProductionEntry.objects.filter(
-                tenant=tenant,
-                operator=employee,
-                entry_datetime__date__range=[start_date, end_date]
-            )
-            
-            labor_hours = production_entries.count()  # 1 entry per hour
-            production = safe_aggregate(production_entries, 'quantity_produced', Sum, 0)
-            
-            total_labor_hours += labor_hours
-            total_production += production
+        stats = labor_stats.get(cc.id, {})
+        total_labor_hours = stats.get('hours', 0)
+        total_production = float(stats.get('production') or 0)
         
         labor_productivity = total_production / max(total_labor_hours, 1)
         
@@ -531,12 +585,14 @@ def cost_center_analysis(request):
     # Sort by total costs (highest first)
     analysis_data.sort(key=lambda x: x['total_costs'], reverse=True)
     
-    return Response({
+    payload = {
         'analysis_period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
         'cost_center_analysis': analysis_data,
         'total_cost_centers': len(analysis_data),
         'highest_cost_center': analysis_data[0]['cost_center_name'] if analysis_data else None
-    })
+    }
+    cache.set(cache_key, payload, ANALYSIS_CACHE_TTL)
+    return Response(payload)
 
 # ===== QUALITY MANAGEMENT =====
 
@@ -555,50 +611,49 @@ def rejection_analysis(request):
     # Get production entries with rejections
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date],
+        **datetime_span('entry_datetime', start_date, end_date),
         quantity_rejected__gt=0
-    ).select_related('work_order__product', 'equipment', 'operator')
+    )
     
-    # Rejection by product
-    product_rejections = {}
-    equipment_rejections = {}
-    operator_rejections = {}
-    daily_rejections = {}
+    # Rejection by product/equipment/operator/day, each grouped in the database
+    product_rejections = {
+        row['work_order__product__sku']: {
+            'product_name': row['work_order__product__product_name'],
+            'total_produced': row['total_produced'],
+            'total_rejected': row['total_rejected'],
+            'rejection_entries': row['rejection_entries']
+        }
+        for row in production_entries.values(
+            'work_order__product__sku', 'work_order__product__product_name'
+        ).annotate(
+            total_produced=Sum('quantity_produced'),
+            total_rejected=Sum('quantity_rejected'),
+            rejection_entries=Count('id')
+        )
+    }
     
-    for entry in production_entries:
-        # By product
-        sku = entry.work_order.product.sku
-        if sku not in product_rejections:
-            product_rejections[sku] = {
-                'product_name': entry.work_order.product.product_name,
-                'total_produced': 0,
-                'total_rejected': 0,
-                'rejection_entries': 0
-            }
-        product_rejections[sku]['total_produced'] += entry.quantity_produced
-        product_rejections[sku]['total_rejected'] += entry.quantity_rejected
-        product_rejections[sku]['rejection_entries'] += 1
-        
-        # By equipment
-        equip_name = entry.equipment.equipment_name
-        if equip_name not in equipment_rejections:
-            equipment_rejections[equip_name] = {'total_rejected': 0, 'entries': 0}
-        equipment_rejections[equip_name]['total_rejected'] += entry.quantity_rejected
-        equipment_rejections[equip_name]['entries'] += 1
-        
-        # By operator
-        operator_name = entry.operator.full_name
-        if operator_name not in operator_rejections:
-            operator_rejections[operator_name] = {'total_rejected': 0, 'entries': 0}
-        operator_rejections[operator_name]['total_rejected'] += entry.quantity_rejected
-        operator_rejections[operator_name]['entries'] += 1
-        
-        # Daily trend
-        date_key = entry.entry_datetime.date()
-        if date_key not in daily_rejections:
-            daily_rejections[date_key] = {'produced': 0, 'rejected': 0}
-        daily_rejections[date_key]['produced'] += entry.quantity_produced
-        daily_rejections[date_key]['rejected'] += entry.quantity_rejected
+    equipment_rejections = {
+        row['equipment__equipment_name']: {'total_rejected': row['total_rejected'], 'entries': row['entries']}
+        for row in production_entries.values('equipment__equipment_name').annotate(
+            total_rejected=Sum('quantity_rejected'), entries=Count('id')
+        )
+    }
+    
+    operator_rejections = {
+        row['operator__full_name']: {'total_rejected': row['total_rejected'], 'entries': row['entries']}
+        for row in production_entries.values('operator__full_name').annotate(
+            total_rejected=Sum('quantity_rejected'), entries=Count('id')
+        )
+    }
+    
+    daily_rejections = {
+        row['entry_datetime__date']: row
+        for row in production_entries.values('entry_datetime__date').annotate(
+            produced=Sum('quantity_produced'), rejected=Sum('quantity_rejected'), entries=Count('id')
+        )
+    }
+    total_entries = sum(d['entries'] for d in daily_rejections.values())
+    total_rejected_qty = sum(d['rejected'] for d in daily_rejections.values())
     
     # Calculate rejection rates
     for sku, data in product_rejections.items():
@@ -629,9 +684,9 @@ def rejection_analysis(request):
     return Response({
         'analysis_period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
         'summary': {
-            'total_rejection_entries': production_entries.count(),
-            'total_rejected_qty': sum(e.quantity_rejected for e in production_entries),
-            'avg_daily_rejections': sum(d['rejected'] for d in daily_rejections.values()) / max(len(daily_rejections), 1)
+            'total_rejection_entries': total_entries,
+            'total_rejected_qty': total_rejected_qty,
+            'avg_daily_rejections': total_rejected_qty / max(len(daily_rejections), 1)
         },
         'top_problem_products': top_problem_products,
         'equipment_performance': equipment_rejections,
@@ -656,23 +711,25 @@ def oee_trends(request):
     if equipment_id:
         equipment_list = [get_object_or_404(Equipment, id=equipment_id, tenant=tenant)]
     else:
-        equipment_list = Equipment.objects.filter(tenant=tenant, is_active=True)
+        equipment_list = list(Equipment.objects.filter(tenant=tenant, is_active=True))
+    
+    # Calculate all dates in the range
+    date_range = []
+    current_date = start_date
+    while current_date <= end_date:
+        date_range.append(current_date)
+        current_date += timedelta(days=1)
+    
+    # One grouped query for every (equipment, day) instead of calculate_oee per cell
+    oee_by_day = calculate_oee_bulk(equipment_list, start_date, end_date)
     
     trends_data = []
     
     for equipment in equipment_list:
         daily_oee = []
-        current_date = start_date
-        
-        # Calculate all dates in the range
-        date_range = []
-        while current_date <= end_date:
-            date_range.append(current_date)
-            current_date += timedelta(days=1)
         
         for date in date_range:
-            # Calculate OEE for this specific date
-            oee_data = calculate_oee(equipment, date)
+            oee_data = oee_by_day[(equipment.id, date)]
             
             daily_oee.append({
                 'date': date.isoformat(),
@@ -732,8 +789,9 @@ def production_anomalies(request):
     anomalies = detect_production_anomalies_with_range(tenant, start_date, end_date)
     
     # Summarize
-    high_severity_count = sum(1 for a in anomalies if a['severity'] == 'HIGH')
-    medium_severity_count = sum(1 for a in anomalies if a['severity'] == 'MEDIUM')
+    severity_counts = Counter(a['severity'] for a in anomalies)
+    high_severity_count = severity_counts['HIGH']
+    medium_severity_count = severity_counts['MEDIUM']
     
     return Response({
         'analysis_period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
@@ -745,6 +803,26 @@ def production_anomalies(request):
     })
 
 
+# Cumulative value share (%) closing each class: A up to 80%, B up to 95%, C the rest
+DEFAULT_ABC_THRESHOLDS = np.array([80.0, 95.0])
+ABC_CLASSES = np.array(['A', 'B', 'C'])
+
+def classify_abc(values, thresholds=DEFAULT_ABC_THRESHOLDS):
+    """
+    Rank inventory values descending (ties keep input order) and class each by its
+    running share of the total: up to 80% -> A, up to 95% -> B, the rest C.
+    Returns (order, sorted_values, total_value, cumulative_pct, classifications).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-values, kind='stable')
+    sorted_values = values[order]
+    # The total is the last running sum, so a share on a threshold compares exactly as before
+    cumulative = np.cumsum(sorted_values)
+    total_value = float(cumulative[-1]) if len(cumulative) else 0.0
+    cumulative_pct = cumulative / max(total_value, 1) * 100
+    classifications = ABC_CLASSES[np.searchsorted(thresholds, cumulative_pct, side='left')]
+    return order, sorted_values, total_value, cumulative_pct, classifications
+
 @api_view(['GET'])
 def abc_analysis(request):
     """ABC analysis for inventory management (robust to different output shapes)."""
@@ -753,7 +831,7 @@ def abc_analysis(request):
         return Response({'error': 'No tenant context'}, status=400)
 
     # If your utility accepts date or warehouse filters, pass them similarly here.
-    valuation_raw = calculate_inventory_valuation(tenant)
+    valuation_raw = cached_inventory_valuation(tenant)
 
     # Normalize into dict: { sku: { 'total_value': ..., 'quantity': ..., 'product_name': ... } }
     valuation = {}
@@ -764,7 +842,9 @@ def abc_analysis(request):
             sku = str(k)
             if isinstance(v, dict):
                 # Ensure numeric fields are floats (safe for sorting / JSON)
-                total_value = v.get('total_value') if v.get('total_value') is not None else v.get('value') if v.get('value') is not None else 0
+                total_value = v.get('total_value')
+                if total_value is None:
+                    total_value = v.get('value')
                 try:
                     total_value = float(total_value)
                 except Exception:
@@ -826,62 +906,45 @@ def abc_analysis(request):
         logger.error("ABC normalization produced empty valuation_data (raw=%r)", valuation_raw)
         return Response({'error': 'No per-SKU valuation data available to run ABC analysis'}, status=400)
 
-    # Now safe to proceed
-    try:
-        # Convert to list of tuples sorted by total_value descending
-        sorted_items = sorted(
-            valuation.items(),
-            key=lambda x: float(x[1].get('total_value', 0) or 0),
-            reverse=True
-        )
-    except Exception as e:
-        logger.exception("Error sorting valuation data for ABC analysis: %s", e)
-        return Response({'error': 'Failed to sort valuation data', 'details': str(e)}, status=500)
-
-    total_value = sum(float(item[1].get('total_value', 0) or 0) for item in sorted_items)
+    # Now safe to proceed: values are floats after normalization, so classify in NumPy
+    skus = list(valuation.keys())
+    values = np.fromiter((d['total_value'] for d in valuation.values()), dtype=np.float64, count=len(skus))
+    order, sorted_values, total_value, cumulative_pct, classifications = classify_abc(values)
 
     # If total_value is zero, classification is meaningless — return graceful message
     if total_value == 0:
         logger.warning("Total inventory value is zero for ABC analysis (tenant=%s).", getattr(tenant, 'id', str(tenant)))
         return Response({
-            'total_items': len(sorted_items),
+            'total_items': len(skus),
             'total_value': 0,
             'classification_summary': {'A': {'items': 0, 'value': 0}, 'B': {'items': 0, 'value': 0}, 'C': {'items': 0, 'value': 0}},
             'abc_analysis': [],
             'warning': 'Total inventory value is zero; ABC classification not performed.'
         })
 
-    # Calculate ABC classification
     abc_analysis_list = []
-    cumulative_value = 0.0
-
-    for sku, data in sorted_items:
-        value = float(data.get('total_value', 0) or 0)
-        cumulative_value += value
-        cumulative_pct = (cumulative_value / max(total_value, 1)) * 100
-
-        if cumulative_pct <= 80:
-            classification = 'A'
-        elif cumulative_pct <= 95:
-            classification = 'B'
-        else:
-            classification = 'C'
-
+    for idx, value, classification, pct in zip(
+        order.tolist(), sorted_values.tolist(), classifications.tolist(), np.round(cumulative_pct, 2).tolist()
+    ):
+        sku = skus[idx]
+        data = valuation[sku]
         abc_analysis_list.append({
             'sku': sku,
             'product_name': data.get('product_name', sku),
             'inventory_value': value,
             'quantity': data.get('quantity', 0),
             'classification': classification,
-            'cumulative_value_pct': round(cumulative_pct, 2)
+            'cumulative_value_pct': pct
         })
 
     # Summary by classification
-    classification_summary = {'A': {'items': 0, 'value': 0.0}, 'B': {'items': 0, 'value': 0.0}, 'C': {'items': 0, 'value': 0.0}}
-    for item in abc_analysis_list:
-        cls = item['classification']
-        classification_summary[cls]['items'] += 1
-        classification_summary[cls]['value'] += float(item['inventory_value'] or 0)
+    classification_summary = {}
+    for cls in ABC_CLASSES.tolist():
+        mask = classifications == cls
+        classification_summary[cls] = {
+            'items': int(mask.sum()),
+            'value': float(sorted_values[mask].sum())
+        }
 
     return Response({
         'total_items': len(abc_analysis_list),
@@ -897,10 +960,10 @@ def category_valuation_detail(request, category_name):
     if not tenant:
         return Response({'error': 'No tenant context'}, status=400)
     
-    valuation_date = request.query_params.get('as_of_date', timezone.now().date())
+    valuation_date = request.query_params.get('as_of_date', get_request_now().date())
     if isinstance(valuation_date, str):
         try:
-            valuation_date = datetime.strptime(valuation_date, '%Y-%m-%d').date()
+            valuation_date = parse_ymd(valuation_date)
         except ValueError:
             return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
     
@@ -909,10 +972,10 @@ def category_valuation_detail(request, category_name):
         tenant=tenant, 
         category=category_name if category_name != 'Uncategorized' else None,
         is_active=True
-    )
+    ).values_list('sku', 'product_name', 'reorder_point', named=True)
     
     # Get valuation data
-    valuation_data = calculate_inventory_valuation(tenant, valuation_date)
+    valuation_data = cached_inventory_valuation(tenant, valuation_date)
     detailed_valuation = valuation_data.get('details', {})
     
     # Filter products in this category
@@ -943,7 +1006,7 @@ def category_valuation_detail(request, category_name):
                 low_stock_count += 1
     
     # Get top products by value
-    top_products = sorted(category_products, key=lambda x: x['total_value'], reverse=True)[:10]
+    top_products = heapq.nlargest(10, category_products, key=itemgetter('total_value'))
     
     return Response({
         'category': category_name,
@@ -971,12 +1034,20 @@ def financial_summary(request):
     if start_date is None:
         return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
 
+    # GL postings bump the analysis version, so it identifies the summary's state
+    etag = _etag(analysis_cache_key('financial_summary', tenant.id, start_date, end_date))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
     summary = generate_financial_summary(tenant, start_date, end_date)
 
-    return Response({
+    response = Response({
         'summary': summary,
         'profitability_status': 'PROFITABLE' if summary['net_profit'] > 0 else 'LOSS_MAKING'
     })
+    response['ETag'] = etag
+    return response
 
 # ===== DASHBOARD OVERVIEW =====
 @api_view(['GET'])
@@ -992,7 +1063,7 @@ def business_overview_dashboard(request):
         return Response({'error': 'Invalid date format (use YYYY-MM-DD)'}, status=400)
     
     dashboard_data = {
-        'date_generated': timezone.now(),
+        'date_generated': get_request_now(),
         'period_covered': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
     }
     
@@ -1009,11 +1080,19 @@ def business_overview_dashboard(request):
     dashboard_data['inventory_status'] = inventory_status
     
     # 4. Financial Highlights
-    financial_highlights = get_financial_highlights(tenant, start_date, end_date)
+    financial_highlights = _cached_dashboard_section('dashboard_financial', get_financial_highlights, tenant, start_date, end_date)
     dashboard_data['financial_highlights'] = financial_highlights
     
+    # Production totals per equipment, shared by the quality and KPI sections
+    equipment_totals = _cached_dashboard_section(
+        'dashboard_equipment_totals', get_equipment_production_totals, tenant, start_date, end_date
+    )
+    
     # 5. Quality Metrics
-    quality_metrics = get_quality_metrics(tenant, start_date, end_date)
+    quality_metrics = _cached_dashboard_section(
+        'dashboard_quality', get_quality_metrics, tenant, start_date, end_date,
+        equipment_totals=equipment_totals
+    )
     dashboard_data['quality_metrics'] = quality_metrics
     
     # 6. Equipment Status
@@ -1025,7 +1104,10 @@ def business_overview_dashboard(request):
     dashboard_data['recent_activities'] = recent_activities
     
     # 8. Key Performance Indicators
-    kpis = get_key_performance_indicators(tenant, start_date, end_date)
+    kpis = _cached_dashboard_section(
+        'dashboard_kpis', get_key_performance_indicators, tenant, start_date, end_date,
+        equipment_totals=equipment_totals
+    )
     dashboard_data['key_performance_indicators'] = kpis
 
     # 9. Production Trends Data
@@ -1043,29 +1125,33 @@ def business_overview_dashboard(request):
 # Add these helper functions to generate trend data
 def get_production_trends_data(tenant, start_date, end_date):
     """Get production trends data for charts"""
+    # One grouped query for the whole range instead of two aggregates per day
+    by_day = {
+        row['day']: row
+        for row in ProductionEntry.objects.filter(
+            tenant=tenant,
+            **datetime_span('entry_datetime', start_date, end_date)
+        ).annotate(day=TruncDate('entry_datetime')).values('day').annotate(
+            produced=Sum('quantity_produced'),
+            rejected=Sum('quantity_rejected')
+        )
+    }
+
+    # Calculate target based on equipment capacity (same for every day)
+    total_capacity = Equipment.objects.filter(
+        tenant=tenant, is_active=True
+    ).aggregate(total=Sum('capacity_per_hour'))['total'] or 0
+    target = total_capacity * 8  # Assuming 8-hour shift
+
     daily_data = []
     current_date = start_date
     
     while current_date <= end_date:
-        # Get production for this day
-        day_entries = ProductionEntry.objects.filter(
-            tenant=tenant,
-            entry_datetime__date=current_date
-        )
-        
-        produced = day_entries.aggregate(total=Sum('quantity_produced'))['total'] or 0
-        rejected = day_entries.aggregate(total=Sum('quantity_rejected'))['total'] or 0
-        
-        # Calculate target based on equipment capacity
-        total_capacity = Equipment.objects.filter(
-            tenant=tenant, is_active=True
-        ).aggregate(total=Sum('capacity_per_hour'))['total'] or 0
-        target = total_capacity * 8  # Assuming 8-hour shift
-        
+        day = by_day.get(current_date, {})
         daily_data.append({
             'date': current_date.strftime('%b %d'),
-            'produced': produced,
-            'rejected': rejected,
+            'produced': day.get('produced') or 0,
+            'rejected': day.get('rejected') or 0,
             'target': target
         })
         
@@ -1077,43 +1163,56 @@ def get_production_trends_data(tenant, start_date, end_date):
         'total_rejected': sum(item['rejected'] for item in daily_data)
     }
 
-def get_financial_trends_data(tenant, start_date, end_date):
-    """Get financial trends data for charts"""
-    weekly_data = []
-    current_date = start_date
-    
+def trend_period_layout(start_date, end_date):
+    """
+    Chart periods for a date range as (step, period_count): period i starts at
+    start_date + i * step days, so a day falls in period (day - start_date).days // step.
+    """
     # Ensure we have at least 4 data points for a good chart
     days_in_period = (end_date - start_date).days
     interval_days = max(1, days_in_period // 4)
-    
-    while current_date <= end_date:
-        period_end = min(current_date + timedelta(days=interval_days), end_date)
-        
-        # Get financial data for this period
-        gl_entries = GLJournalLine.objects.filter(
-            tenant=tenant,
-            journal__status='posted',
-            journal__posting_date__range=[current_date, period_end]
+    step = interval_days + 1
+    return step, days_in_period // step + 1
+
+def get_financial_trends_data(tenant, start_date, end_date):
+    """Get financial trends data for charts"""
+    step, period_count = trend_period_layout(start_date, end_date)
+
+    # One grouped query by posting date; days are folded into periods below
+    daily_totals = GLJournalLine.objects.filter(
+        tenant=tenant,
+        journal__status='posted',
+        journal__posting_date__range=[start_date, end_date]
+    ).values('journal__posting_date').annotate(
+        revenue=Sum(
+            F('credit_amount') - F('debit_amount'),
+            filter=Q(account__account_type='revenue')
+        ),
+        expenses=Sum(
+            F('debit_amount') - F('credit_amount'),
+            filter=Q(account__account_type='expense')
         )
-        
-        revenue = gl_entries.filter(
-            account__account_type='revenue'
-        ).aggregate(total=Sum(F('credit_amount') - F('debit_amount')))['total'] or 0
-        
-        expenses = gl_entries.filter(
-            account__account_type='expense'
-        ).aggregate(total=Sum(F('debit_amount') - F('credit_amount')))['total'] or 0
-        
+    )
+
+    period_revenue = [Decimal('0')] * period_count
+    period_expenses = [Decimal('0')] * period_count
+    for row in daily_totals:
+        idx = (row['journal__posting_date'] - start_date).days // step
+        period_revenue[idx] += row['revenue'] or 0
+        period_expenses[idx] += row['expenses'] or 0
+
+    weekly_data = []
+    for idx in range(period_count):
+        revenue = period_revenue[idx]
+        expenses = period_expenses[idx]
         profit = revenue - expenses
         
         weekly_data.append({
-            'date': current_date.strftime('%b %d'),
+            'date': (start_date + timedelta(days=idx * step)).strftime('%b %d'),
             'revenue': float(revenue),
             'expenses': float(expenses),
             'profit': float(profit)
         })
-        
-        current_date += timedelta(days=interval_days + 1)
     
     return {
         'period_data': weekly_data,
@@ -1122,22 +1221,18 @@ def get_financial_trends_data(tenant, start_date, end_date):
         'total_profit': sum(item['profit'] for item in weekly_data)
     }
     
-def calculate_urgency_score(work_order):
+# Upper bounds (days to due) and the base urgency for each band:
+# overdue, due tomorrow, due in 3 days, due in a week, future
+_URGENCY_DAY_THRESHOLDS = (0, 1, 3, 7)
+_URGENCY_SCORES = (100, 90, 70, 50, 20)
+
+def calculate_urgency_score(work_order, today=None):
     """Calculate urgency score for work order prioritization"""
-    today = timezone.now().date()
+    today = today or get_request_now().date()
     days_to_due = (work_order.due_date - today).days
     
     # Base urgency on due date proximity
-    if days_to_due <= 0:
-        urgency = 100  # Overdue
-    elif days_to_due <= 1:
-        urgency = 90   # Due tomorrow
-    elif days_to_due <= 3:
-        urgency = 70   # Due in 3 days
-    elif days_to_due <= 7:
-        urgency = 50   # Due in a week
-    else:
-        urgency = 20   # Future
+    urgency = _URGENCY_SCORES[bisect_left(_URGENCY_DAY_THRESHOLDS, days_to_due)]
     
     # Adjust based on priority (1=High, 10=Low)
     priority_adjustment = (11 - work_order.priority) * 5
@@ -1156,7 +1251,7 @@ def get_bottleneck_equipment(equipment_schedule):
                 'pending_orders': len(equip['recommended_orders'])
             })
     
-    return sorted(bottlenecks, key=lambda x: x['utilization_pct'], reverse=True)
+    return sorted(bottlenecks, key=itemgetter('utilization_pct'), reverse=True)
 
 def get_capacity_status(utilization_pct, pending_hours, available_hours):
     """Determine capacity status"""
@@ -1219,41 +1314,28 @@ def detect_production_anomalies_with_range(tenant, start_date, end_date):
     """Detect production anomalies within a date range"""
     anomalies = []
     
-    # Get production entries in the date range
-    production_entries = ProductionEntry.objects.filter(
+    # Group by equipment and hour (UTC, as stored) in SQL to find anomalies; name and
+    # rated capacity come through the entry's own equipment join, one value per group
+    equipment_hourly_data = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
-    ).select_related('work_order__product', 'equipment', 'operator')
-    
-    # Group by equipment and hour to find anomalies
-    equipment_hourly_data = {}
-    
-    for entry in production_entries:
-        hour_key = f"{entry.equipment.id}_{entry.entry_datetime.hour}"
-        
-        if hour_key not in equipment_hourly_data:
-            equipment_hourly_data[hour_key] = {
-                'equipment': entry.equipment,
-                'hour': entry.entry_datetime.hour,
-                'entries': [],
-                'total_produced': 0,
-                'total_rejected': 0
-            }
-        
-        equipment_hourly_data[hour_key]['entries'].append(entry)
-        equipment_hourly_data[hour_key]['total_produced'] += entry.quantity_produced
-        equipment_hourly_data[hour_key]['total_rejected'] += entry.quantity_rejected
+        **datetime_span('entry_datetime', start_date, end_date)
+    ).annotate(
+        hour=ExtractHour('entry_datetime', tzinfo=dt_timezone.utc)
+    ).values('equipment_id', 'equipment__equipment_name', 'equipment__capacity_per_hour', 'hour').annotate(
+        total_produced=Sum('quantity_produced'),
+        total_rejected=Sum('quantity_rejected')
+    ).order_by('equipment_id', 'hour')
     
     # Analyze each hour for anomalies
-    for hour_data in equipment_hourly_data.values():
-        equipment = hour_data['equipment']
-        expected_production = equipment.capacity_per_hour
+    for hour_data in equipment_hourly_data:
+        equipment_name = hour_data['equipment__equipment_name']
+        expected_production = hour_data['equipment__capacity_per_hour']
         
         # Check for low production
         if hour_data['total_produced'] < expected_production * 0.5:
             anomalies.append({
                 'type': 'LOW_PRODUCTION',
-                'equipment': equipment.equipment_name,
+                'equipment': equipment_name,
                 'hour': hour_data['hour'],
                 'expected': expected_production,
                 'actual': hour_data['total_produced'],
@@ -1268,7 +1350,7 @@ def detect_production_anomalies_with_range(tenant, start_date, end_date):
             if rejection_rate > 10:  # More than 10% rejection
                 anomalies.append({
                     'type': 'HIGH_REJECTION',
-                    'equipment': equipment.equipment_name,
+                    'equipment': equipment_name,
                     'hour': hour_data['hour'],
                     'rejection_rate': round(rejection_rate, 2),
                     'severity': 'HIGH' if rejection_rate > 20 else 'MEDIUM',
@@ -1283,12 +1365,17 @@ def get_production_summary(tenant, start_date, end_date):
     # Total production entries
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     )
     
-    total_entries = production_entries.count()
-    total_produced = production_entries.aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
-    total_rejected = production_entries.aggregate(Sum('quantity_rejected'))['quantity_rejected__sum'] or 0
+    totals = production_entries.aggregate(
+        entries=Count('id'),
+        produced=Sum('quantity_produced'),
+        rejected=Sum('quantity_rejected')
+    )
+    total_entries = totals['entries']
+    total_produced = totals['produced'] or 0
+    total_rejected = totals['rejected'] or 0
     
     # Active work orders
     active_work_orders = WorkOrder.objects.filter(
@@ -1361,7 +1448,7 @@ def get_production_summary(tenant, start_date, end_date):
 
 def get_upcoming_work_orders(tenant):
     """Get work orders that are planned but not started, with due dates approaching"""
-    today = timezone.now().date()
+    today = get_request_now().date()
     next_week = today + timedelta(days=7)
     
     # Get planned work orders due in the next week
@@ -1371,23 +1458,26 @@ def get_upcoming_work_orders(tenant):
         due_date__lte=next_week,
         due_date__gte=today,
         is_active=True
-    ).select_related('product', 'cost_center').order_by('due_date', 'priority')[:10]  # Limit to 10 most urgent
+    ).order_by('due_date', 'priority').values(
+        'wo_number', 'product__sku', 'product__product_name', 'quantity_planned',
+        'due_date', 'priority', 'cost_center__name'
+    )[:10]  # Limit to 10 most urgent
     
     orders_data = []
     for order in upcoming_orders:
-        days_until_due = (order.due_date - today).days
+        days_until_due = (order['due_date'] - today).days
         urgency = "HIGH" if days_until_due <= 2 else "MEDIUM" if days_until_due <= 5 else "LOW"
         
         orders_data.append({
-            'wo_number': order.wo_number,
-            'product_sku': order.product.sku,
-            'product_name': order.product.product_name,
-            'quantity_planned': order.quantity_planned,
-            'due_date': order.due_date.isoformat(),
+            'wo_number': order['wo_number'],
+            'product_sku': order['product__sku'],
+            'product_name': order['product__product_name'],
+            'quantity_planned': order['quantity_planned'],
+            'due_date': order['due_date'].isoformat(),
             'days_until_due': days_until_due,
-            'priority': order.priority,
+            'priority': order['priority'],
             'urgency': urgency,
-            'cost_center': order.cost_center.name
+            'cost_center': order['cost_center__name']
         })
     
     return {
@@ -1401,22 +1491,22 @@ def get_upcoming_work_orders(tenant):
 def _extract_total_value(x):
     """
     Accept a scalar total, a dict with common total keys, or derive qty * unit cost.
-    Returns a float (0.0 if unknown).
+    Returns a float (0.0 if unknown); Decimals are converted here so callers only add floats.
     """
-    if isinstance(x, (int, float)):
+    if isinstance(x, (int, float, Decimal)):
         return float(x)
 
     if isinstance(x, dict):
         # direct total fields
         for k in ('total_value', 'value', 'inventory_value', 'amount'):
             v = x.get(k)
-            if isinstance(v, (int, float)):
+            if isinstance(v, (int, float, Decimal)):
                 return float(v)
         # derive from qty * unit price/cost
         qty_keys = ('qty', 'quantity', 'on_hand', 'stock', 'balance')
         price_keys = ('unit_price', 'price', 'avg_cost', 'cost')
-        q = next((x.get(k) for k in qty_keys if isinstance(x.get(k), (int, float))), None)
-        p = next((x.get(k) for k in price_keys if isinstance(x.get(k), (int, float))), None)
+        q = next((x.get(k) for k in qty_keys if isinstance(x.get(k), (int, float, Decimal))), None)
+        p = next((x.get(k) for k in price_keys if isinstance(x.get(k), (int, float, Decimal))), None)
         if q is not None and p is not None:
             return float(q) * float(p)
 
@@ -1457,14 +1547,14 @@ def _to_iso(dt):
 def get_inventory_status(tenant):
     """Get inventory status summary"""
     # Get current inventory valuation (can be: dict, list, or scalar)
-    valuation_data = calculate_inventory_valuation(tenant)
+    valuation_data = cached_inventory_valuation(tenant)
 
     # Total value tolerant to shapes
     if isinstance(valuation_data, dict):
-        total_value = sum(_extract_total_value(v) for v in valuation_data.values())
+        total_value = math.fsum(_extract_total_value(v) for v in valuation_data.values())
         total_items = len(valuation_data)
     elif isinstance(valuation_data, (list, tuple)):
-        total_value = sum(_extract_total_value(v) for v in valuation_data)
+        total_value = math.fsum(_extract_total_value(v) for v in valuation_data)
         # Count distinct SKUs when possible
         skus = { (item.get('sku') or item.get('product_sku') or item.get('code'))
                  for item in valuation_data if isinstance(item, dict) and (
@@ -1475,11 +1565,20 @@ def get_inventory_status(tenant):
         total_items = 1 if total_value else 0
 
     # Check for low stock items (only possible if we have per-SKU rows)
+    # Every low item is counted, but only the first five are built for the preview
     low_stock_items = []
-    for sku, data in _iter_valuation_items(valuation_data):
-        try:
-            product = Product.objects.get(tenant=tenant, sku=sku)
-        except Product.DoesNotExist:
+    low_stock_count = 0
+    valuation_items = list(_iter_valuation_items(valuation_data))
+    # sku is only unique per tenant, so in_bulk(field_name='sku') is not available; one IN query instead
+    products_by_sku = {
+        product.sku: product
+        for product in Product.objects.filter(
+            tenant=tenant, sku__in=[sku for sku, _ in valuation_items]
+        ).only('sku', 'product_name', 'reorder_point')
+    }
+    for sku, data in valuation_items:
+        product = products_by_sku.get(sku)
+        if product is None:
             continue
 
         qty = data.get('quantity') or data.get('qty') or data.get('on_hand') or 0
@@ -1492,6 +1591,9 @@ def get_inventory_status(tenant):
         rp = getattr(product, 'reorder_point', 0) or 0
 
         if 0 < qty <= rp:
+            low_stock_count += 1
+            if len(low_stock_items) >= 5:
+                continue
             urgency = 'CRITICAL' if rp > 0 and qty <= (rp * 0.3) else 'WARNING'
             low_stock_items.append({
                 'sku': sku,
@@ -1503,63 +1605,71 @@ def get_inventory_status(tenant):
 
     # Get recent stock movements (last 2 days)
     recent_movements = (StockMovement.objects
-                        .filter(tenant=tenant, movement_date__gte=timezone.now() - timedelta(days=2))
-                        .select_related('product', 'warehouse')
-                        .order_by('-movement_date')[:5])
+                        .filter(tenant=tenant, movement_date__gte=get_request_now() - timedelta(days=2))
+                        .order_by('-movement_date')
+                        .values('movement_type', 'product__sku', 'product__product_name', 'quantity',
+                                'warehouse__warehouse_name', 'movement_date')[:5])
 
     movements_data = []
     for movement in recent_movements:
         movements_data.append({
-            'movement_type': movement.movement_type,
-            'product_sku': getattr(movement.product, 'sku', None),
-            'product_name': getattr(movement.product, 'product_name', None),
-            'quantity': movement.quantity,
-            'warehouse': getattr(movement.warehouse, 'warehouse_name', None),
-            'movement_date': _to_iso(movement.movement_date),
+            'movement_type': movement['movement_type'],
+            'product_sku': movement['product__sku'],
+            'product_name': movement['product__product_name'],
+            'quantity': movement['quantity'],
+            'warehouse': movement['warehouse__warehouse_name'],
+            'movement_date': _to_iso(movement['movement_date']),
         })
 
     return {
         'total_inventory_value': float(total_value),
         'total_items': _safe_int(total_items),
-        'low_stock_items_count': len(low_stock_items),
-        'low_stock_items': low_stock_items[:5],  # Top 5 most critical
+        'low_stock_items_count': low_stock_count,
+        'low_stock_items': low_stock_items,  # Top 5 most critical
         'recent_movements': movements_data,
     }
 
 
 def get_financial_highlights(tenant, start_date, end_date):
     """Get financial highlights for the period"""
-    # Generate P&L for the period
-    gl_entries = (GLJournalLine.objects
-                  .filter(
-                      tenant=tenant,
-                      journal__status='posted',
-                      journal__posting_date__range=[start_date, end_date]
-                  )
-                  .select_related('account'))
+    # Generate P&L for the period: one pass grouped by account, pivoted by type below
+    account_totals = (GLJournalLine.objects
+                      .filter(
+                          tenant=tenant,
+                          journal__status='posted',
+                          journal__posting_date__range=[start_date, end_date],
+                          account__account_type__in=['revenue', 'cogs', 'expense']
+                      )
+                      .values('account__account_type', 'account__account_name')
+                      .annotate(net_credit=Sum(F('credit_amount') - F('debit_amount'))))
 
     # Calculate key financial metrics
-    revenue = (gl_entries.filter(account__account_type='revenue')
-               .aggregate(total=Sum(F('credit_amount') - F('debit_amount')))['total'] or 0)
-
-    cogs = (gl_entries.filter(account__account_type='cogs')
-            .aggregate(total=Sum(F('debit_amount') - F('credit_amount')))['total'] or 0)
+    totals = {'revenue': Decimal('0'), 'cogs': Decimal('0'), 'expense': Decimal('0')}
+    expense_accounts = []
+    for row in account_totals:
+        account_type = row['account__account_type']
+        net_credit = row['net_credit'] or 0
+        if account_type == 'revenue':
+            totals['revenue'] += net_credit
+        else:
+            # cogs and expenses are debit-normal
+            totals[account_type] -= net_credit
+            if account_type == 'expense':
+                expense_accounts.append((row['account__account_name'], -net_credit))
 
-    expenses = (gl_entries.filter(account__account_type='expense')
-                .aggregate(total=Sum(F('debit_amount') - F('credit_amount')))['total'] or 0)
+    revenue = totals['revenue']
+    cogs = totals['cogs']
+    expenses = totals['expense']
 
     gross_profit = revenue - cogs
     net_profit = gross_profit - expenses
+    # Margins stay in Decimal; everything is converted to float once, in the response
+    gross_margin = gross_profit / revenue * 100 if revenue else Decimal('0')
+    net_margin = net_profit / revenue * 100 if revenue else Decimal('0')
 
-    # Get top expenses
-    top_expenses_qs = (gl_entries.filter(account__account_type='expense')
-                       .values('account__account_name')
-                       .annotate(amount=Sum(F('debit_amount') - F('credit_amount')))
-                       .order_by('-amount')[:5])
-
-    # Normalize top_expenses to stable keys
-    top_expenses = [{'account_name': row['account__account_name'], 'amount': float(row['amount'] or 0)}
-                    for row in top_expenses_qs]
+    # Get top expenses, normalized to stable keys
+    top_expenses = [{'account_name': name, 'amount': float(amount)}
+                    for name, amount in heapq.nlargest(5, expense_accounts, key=itemgetter(1))]
 
     return {
         'revenue': float(revenue),
@@ -1567,22 +1677,30 @@ def get_financial_highlights(tenant, start_date, end_date):
         'gross_profit': float(gross_profit),
         'operating_expenses': float(expenses),
         'net_profit': float(net_profit),
-        'gross_margin': (float(gross_profit) / float(revenue)) * 100 if revenue else 0.0,
-        'net_margin': (float(net_profit) / float(revenue)) * 100 if revenue else 0.0,
+        'gross_margin': float(gross_margin),
+        'net_margin': float(net_margin),
         'top_expenses': top_expenses,
         'period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
     }
 
 
-def get_quality_metrics(tenant, start_date, end_date):
-    """Get quality metrics for dashboard"""
+def get_quality_metrics(tenant, start_date, end_date, equipment_totals=None):
+    """Get quality metrics for dashboard (optionally from preloaded per-equipment totals)"""
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     )
     
-    total_produced = safe_aggregate(production_entries, 'quantity_produced', Sum, 0)
-    total_rejected = safe_aggregate(production_entries, 'quantity_rejected', Sum, 0)
+    if equipment_totals is None:
+        totals = production_entries.aggregate(
+            produced=Sum('quantity_produced'),
+            rejected=Sum('quantity_rejected')
+        )
+        total_produced = totals['produced'] or 0
+        total_rejected = totals['rejected'] or 0
+    else:
+        total_produced = sum(row['produced'] or 0 for row in equipment_totals)
+        total_rejected = sum(row['rejected'] or 0 for row in equipment_totals)
     total_output = total_produced + total_rejected
     
     rejection_rate = (total_rejected / max(total_output, 1)) * 100
@@ -1612,126 +1730,139 @@ def get_quality_metrics(tenant, start_date, end_date):
 
 def get_equipment_status(tenant):
     """Get equipment status summary"""
-    equipment_list = Equipment.objects.filter(tenant=tenant, is_active=True)
+    now = get_request_now()
+    window_start = now - timedelta(days=1)
+    # Maintenance bands compare UTC calendar days, as the stored datetimes are UTC
+    tomorrow = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    # Maintenance status and last-24h production annotated in one equipment query
+    equipment_list = list(Equipment.objects.filter(tenant=tenant, is_active=True).annotate(
+        recent_production=Coalesce(
+            Sum(
+                'productionentry__quantity_produced',
+                filter=Q(productionentry__tenant=tenant, productionentry__entry_datetime__gte=window_start)
+            ),
+            0
+        ),
+        maintenance_status=Case(
+            When(next_maintenance__lt=tomorrow, then=Value('MAINTENANCE_NEEDED')),
+            When(next_maintenance__lt=tomorrow + timedelta(days=7), then=Value('MAINTENANCE_SOON')),
+            default=Value('OK'),
+            output_field=CharField()
+        )
+    ).values(
+        'equipment_code', 'equipment_name', 'next_maintenance', 'recent_production', 'maintenance_status'
+    ))
 
     status_summary = {
-        'total_equipment': equipment_list.count(),
-        'equipment_details': []
+        'total_equipment': len(equipment_list),
+        'equipment_details': [
+            {
+                'equipment_code': equipment['equipment_code'],
+                'equipment_name': equipment['equipment_name'],
+                'maintenance_status': equipment['maintenance_status'],
+                'next_maintenance': _to_iso(equipment['next_maintenance']) if equipment['next_maintenance'] else None,
+                'recent_production': equipment['recent_production'],
+                'status': 'ACTIVE' if equipment['recent_production'] > 0 else 'IDLE'
+            }
+            for equipment in equipment_list
+        ]
     }
 
-    today = timezone.now().date()
-
-    for equipment in equipment_list:
-        # next_maintenance may be date or datetime or None
-        nm = getattr(equipment, 'next_maintenance', None)
-        nm_date = nm.date() if hasattr(nm, 'date') else nm
-
-        # Check maintenance status
-        maintenance_status = "OK"
-        if nm_date:
-            if nm_date <= today:
-                maintenance_status = "MAINTENANCE_NEEDED"
-            elif nm_date <= (today + timedelta(days=7)):
-                maintenance_status = "MAINTENANCE_SOON"
-
-        # Recent production in last 24h
-        recent_production = (ProductionEntry.objects
-                             .filter(
-                                 tenant=tenant,
-                                 equipment=equipment,
-                                 entry_datetime__gte=timezone.now() - timedelta(days=1)
-                             )
-                             .aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0)
-
-        status_summary['equipment_details'].append({
-            'equipment_code': equipment.equipment_code,
-            'equipment_name': equipment.equipment_name,
-            'maintenance_status': maintenance_status,
-            'next_maintenance': _to_iso(nm) if nm else None,
-            'recent_production': recent_production,
-            'status': 'ACTIVE' if recent_production > 0 else 'IDLE'
-        })
-
     return status_summary
 
 def get_recent_activities(tenant):
     """Get recent activities for dashboard"""
     recent_entries = ProductionEntry.objects.filter(
         tenant=tenant
-    ).select_related('work_order__product', 'equipment').order_by('-entry_datetime')[:5]
+    ).order_by('-entry_datetime').values(
+        'work_order__product__sku', 'equipment__equipment_name', 'quantity_produced', 'entry_datetime'
+    )[:5]
     
     return [
         {
-            'product_sku': entry.work_order.product.sku,
-            'equipment': entry.equipment.equipment_name,
-            'quantity_produced': entry.quantity_produced,
-            'timestamp': entry.entry_datetime.isoformat()
+            'product_sku': entry['work_order__product__sku'],
+            'equipment': entry['equipment__equipment_name'],
+            'quantity_produced': entry['quantity_produced'],
+            'timestamp': entry['entry_datetime'].isoformat()
         }
         for entry in recent_entries
     ]
 
-def get_key_performance_indicators(tenant, start_date, end_date):
+def get_equipment_production_totals(tenant, start_date, end_date):
+    """Per-equipment production totals for the period, shared by the dashboard quality/KPI sections"""
+    return list(ProductionEntry.objects.filter(
+        tenant=tenant,
+        **datetime_span('entry_datetime', start_date, end_date)
+    ).values('equipment_id').annotate(
+        produced=Sum('quantity_produced'),
+        rejected=Sum('quantity_rejected'),
+        downtime=Sum('downtime_minutes'),
+        entries=Count('id')
+    ))
+
+def get_key_performance_indicators(tenant, start_date, end_date, equipment_totals=None):
     """Calculate key performance indicators"""
-    # OEE (Overall Equipment Effectiveness)
-    equipment_list = Equipment.objects.filter(tenant=tenant, is_active=True)
+    # Per-equipment production totals in one grouped query; also feeds the rejection rate below
+    if equipment_totals is None:
+        equipment_totals = get_equipment_production_totals(tenant, start_date, end_date)
+
+    # OEE (Overall Equipment Effectiveness) over active equipment only
+    capacity_by_equipment = dict(
+        Equipment.objects.filter(tenant=tenant, is_active=True).values_list('id', 'capacity_per_hour')
+    )
     total_oee = 0.0
     equipment_count = 0
+    total_produced = 0
+    total_rejected = 0
 
-    for equipment in equipment_list:
-        entries = ProductionEntry.objects.filter(
-            tenant=tenant,
-            equipment=equipment,
-            entry_datetime__date__range=[start_date, end_date]
-        )
+    for row in equipment_totals:
+        produced = row['produced'] or 0
+        rejected = row['rejected'] or 0
+        total_produced += produced
+        total_rejected += rejected
 
-        if entries.exists():
-            total_produced = entries.aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
-            total_rejected = entries.aggregate(Sum('quantity_rejected'))['quantity_rejected__sum'] or 0
-            total_downtime = entries.aggregate(Sum('downtime_minutes'))['downtime_minutes__sum'] or 0
+        if row['equipment_id'] not in capacity_by_equipment:
+            continue
 
-            # Treat each entry as an "hour" (your existing simplification)
-            hours_operated = entries.count()
+        # Treat each entry as an "hour" (your existing simplification)
+        hours_operated = row['entries']
 
-            # Availability
-            total_minutes = hours_operated * 60
-            availability = ((total_minutes - (total_downtime or 0)) / total_minutes * 100) if total_minutes > 0 else 0.0
+        # Availability
+        total_minutes = hours_operated * 60
+        availability = ((total_minutes - (row['downtime'] or 0)) / total_minutes * 100) if total_minutes > 0 else 0.0
 
-            # Performance: produced / theoretical capacity
-            theoretical_output = (getattr(equipment, 'capacity_per_hour', 0) or 0) * hours_operated
-            performance = ((total_produced or 0) / theoretical_output * 100) if theoretical_output > 0 else 0.0
+        # Performance: produced / theoretical capacity
+        theoretical_output = (capacity_by_equipment[row['equipment_id']] or 0) * hours_operated
+        performance = (produced / theoretical_output * 100) if theoretical_output > 0 else 0.0
 
-            # Quality
-            total_output = (total_produced or 0) + (total_rejected or 0)
-            quality = ((total_produced or 0) / total_output * 100) if total_output > 0 else 0.0
+        # Quality
+        total_output = produced + rejected
+        quality = (produced / total_output * 100) if total_output > 0 else 0.0
 
-            # OEE (A * P * Q) / 10000 (since A,P,Q in %)
-            oee = (availability * performance * quality) / 10000.0
-            total_oee += oee
-            equipment_count += 1
+        # OEE (A * P * Q) / 10000 (since A,P,Q in %)
+        oee = (availability * performance * quality) / 10000.0
+        total_oee += oee
+        equipment_count += 1
 
     avg_oee = (total_oee / equipment_count) if equipment_count > 0 else 0.0
 
     # Production efficiency (rejection rate)
-    production_entries = ProductionEntry.objects.filter(
-        tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
-    )
-
-    total_produced = production_entries.aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
-    total_rejected = production_entries.aggregate(Sum('quantity_rejected'))['quantity_rejected__sum'] or 0
-    total_output = (total_produced or 0) + (total_rejected or 0)
-    rejection_rate = ((total_rejected or 0) / total_output * 100) if total_output > 0 else 0.0
+    total_output = total_produced + total_rejected
+    rejection_rate = (total_rejected / total_output * 100) if total_output > 0 else 0.0
 
     # On-time delivery (simplified - assuming completed WOs were delivered)
     completed_orders = WorkOrder.objects.filter(
         tenant=tenant,
         status='completed',
         updated_at__date__range=[start_date, end_date]
+    ).aggregate(
+        total=Count('id'),
+        on_time=Count('id', filter=Q(due_date__gte=F('updated_at__date')))
     )
 
-    completed_count = completed_orders.count()
-    on_time_orders = completed_orders.filter(due_date__gte=F('updated_at__date'))
-    on_time_delivery = (on_time_orders.count() / completed_count * 100) if completed_count > 0 else 0.0
+    completed_count = completed_orders['total']
+    on_time_delivery = (completed_orders['on_time'] / completed_count * 100) if completed_count > 0 else 0.0
 
     return {
         'overall_equipment_effectiveness': round(avg_oee, 2),
@@ -1741,6 +1872,9 @@ def get_key_performance_indicators(tenant, start_date, end_date):
     }
 
 # ===== MATERIAL CONSUMPTION ANALYSIS =====
+MATERIAL_CONSUMPTION_CACHE_TTL = 300
+DASHBOARD_ALERTS_CACHE_TTL = 60
+
 @api_view(['GET'])
 def material_consumption_report(request, wo_id=None):
     """Material consumption report for a work order"""
@@ -1750,7 +1884,11 @@ def material_consumption_report(request, wo_id=None):
     
     if wo_id:
         work_order = get_object_or_404(WorkOrder, id=wo_id, tenant=tenant)
-        consumption_data = calculate_material_consumption(work_order)
+        # Issues are stock movements, so the stock version retires this entry on new postings
+        consumption_key = f"material_consumption:{tenant.id}:{stock_cache_version(tenant.id)}:{work_order.id}"
+        consumption_data = cache.get_or_set(
+            consumption_key, lambda: calculate_material_consumption(work_order), MATERIAL_CONSUMPTION_CACHE_TTL
+        )
         
         # Calculate totals
         total_consumed = sum(item['actual_consumed'] for item in consumption_data.values())
@@ -1774,16 +1912,29 @@ def dashboard_alerts(request):
     if not tenant:
         return Response({'error': 'No tenant context'}, status=400)
     
-    alerts = get_dashboard_alerts(tenant)
+    # Dashboards poll this endpoint; share one computation per tenant per minute
+    alerts_key = f"dashboard_alerts:{tenant.id}:{int(time.time()) // 60}"
+    etag = _etag(alerts_key)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    alerts = cache.get_or_set(
+        alerts_key,
+        lambda: get_dashboard_alerts(tenant),
+        DASHBOARD_ALERTS_CACHE_TTL
+    )
     
     # Summarize
     critical_alerts = sum(1 for a in alerts if a['severity'] == 'HIGH')
     
-    return Response({
+    response = Response({
         'total_alerts': len(alerts),
         'critical_alerts': critical_alerts,
         'alerts': alerts
     })
+    response['ETag'] = etag
+    return response
 
 @api_view(['GET'])
 def overdue_work_orders(request):
@@ -1792,36 +1943,51 @@ def overdue_work_orders(request):
     if not tenant:
         return Response({'error': 'No tenant context'}, status=400)
     
-    today = timezone.now().date()
+    today = get_request_now().date()
+
+    # Work order / cost center saves bump the analysis version, product edits the stock
+    # version; the day rolls "overdue" forward
+    etag = _etag(
+        f"{analysis_cache_key('overdue_work_orders', tenant.id, today, today)}:{stock_cache_version(tenant.id)}"
+    )
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
     
     overdue_orders = WorkOrder.objects.filter(
         tenant=tenant,
         due_date__lt=today,
         status__in=['planned', 'released', 'in_progress'],
         is_active=True
-    ).select_related('product', 'cost_center').order_by('due_date', 'priority')
+    ).order_by('due_date', 'priority').values(
+        'wo_number', 'product__sku', 'product__product_name', 'quantity_planned',
+        'quantity_completed', 'due_date', 'status', 'priority', 'cost_center__name'
+    )
     
     orders_data = []
-    for order in overdue_orders:
-        days_overdue = (today - order.due_date).days
+    # Stream rows; the overdue backlog is unbounded
+    for order in overdue_orders.iterator(chunk_size=500):
+        days_overdue = (today - order['due_date']).days
         
         orders_data.append({
-            'wo_number': order.wo_number,
-            'product_sku': order.product.sku,
-            'product_name': order.product.product_name,
-            'quantity_planned': order.quantity_planned,
-            'quantity_completed': order.quantity_completed,
-            'due_date': order.due_date.isoformat(),
+            'wo_number': order['wo_number'],
+            'product_sku': order['product__sku'],
+            'product_name': order['product__product_name'],
+            'quantity_planned': order['quantity_planned'],
+            'quantity_completed': order['quantity_completed'],
+            'due_date': order['due_date'].isoformat(),
             'days_overdue': days_overdue,
-            'status': order.status,
-            'priority': order.priority,
-            'cost_center': order.cost_center.name
+            'status': order['status'],
+            'priority': order['priority'],
+            'cost_center': order['cost_center__name']
         })
     
-    return Response({
+    response = Response({
         'count': len(orders_data),
         'orders': orders_data
     })
+    response['ETag'] = etag
+    return response
 
 @api_view(['GET'])
 def equipment_work_order_history(request, equipment_id=None):
@@ -1851,7 +2017,7 @@ def equipment_work_order_history(request, equipment_id=None):
             production_entries = ProductionEntry.objects.filter(
                 tenant=tenant,
                 equipment=equipment,
-                entry_datetime__date__range=[start_date, end_date]
+                **datetime_span('entry_datetime', start_date, end_date)
             ).select_related('work_order', 'work_order__product', 'work_order__cost_center')
             
             # Get unique work orders from production entries
@@ -2136,7 +2302,7 @@ def get_production_trend_data(tenant, start_date, end_date, timeframe):
     """Generate production trend data for charts"""
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     ).select_related('work_order__product', 'equipment')
     
     # Group by date based on timeframe
@@ -2146,7 +2312,7 @@ def get_production_trend_data(tenant, start_date, end_date, timeframe):
     if timeframe in ['7d', '30d']:
         # Daily data
         while current_date <= end_date:
-            day_entries = production_entries.filter(entry_datetime__date=current_date)
+            day_entries = production_entries.filter(**datetime_span('entry_datetime', current_date, current_date))
             produced = day_entries.aggregate(total=Sum('quantity_produced'))['total'] or 0
             rejected = day_entries.aggregate(total=Sum('quantity_rejected'))['total'] or 0
             
@@ -2171,7 +2337,7 @@ def get_production_trend_data(tenant, start_date, end_date, timeframe):
         while current_date <= end_date:
             week_end = min(current_date + timedelta(days=6), end_date)
             week_entries = production_entries.filter(
-                entry_datetime__date__range=[current_date, week_end]
+                **datetime_span('entry_datetime', current_date, week_end)
             )
             produced = week_entries.aggregate(total=Sum('quantity_produced'))['total'] or 0
             
@@ -2200,7 +2366,7 @@ def get_quality_efficiency_correlation(tenant, start_date, end_date):
         entries = ProductionEntry.objects.filter(
             tenant=tenant,
             equipment=equipment,
-            entry_datetime__date__range=[start_date, end_date]
+            **datetime_span('entry_datetime', start_date, end_date)
         )
         
         if entries.exists():
@@ -2229,7 +2395,7 @@ def get_downtime_breakdown(tenant, start_date, end_date):
     """Generate downtime breakdown for pie chart"""
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date],
+        **datetime_span('entry_datetime', start_date, end_date),
         downtime_minutes__gt=0
     )
     
@@ -2266,7 +2432,7 @@ def get_performance_radar_data(tenant, start_date, end_date):
     # Get overall metrics
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     )
     
     # Calculate various performance metrics
@@ -2340,7 +2506,7 @@ def get_overall_analytics_metrics(tenant, start_date, end_date):
     """Calculate overall analytics metrics"""
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     )
     
     # Overall efficiency (OEE-like metric)
@@ -2371,7 +2537,7 @@ def get_overall_analytics_metrics(tenant, start_date, end_date):
     
     prev_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[prev_start_date, prev_end_date]
+        **datetime_span('entry_datetime', prev_start_date, prev_end_date)
     )
     prev_produced = prev_entries.aggregate(total=Sum('quantity_produced'))['total'] or 0
     prev_rejected = prev_entries.aggregate(total=Sum('quantity_rejected'))['total'] or 0
@@ -2406,7 +2572,7 @@ def get_real_time_insights(tenant, start_date, end_date):
     # Get current production data
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     )
     
     # Insight 1: Production trend
@@ -2414,7 +2580,7 @@ def get_real_time_insights(tenant, start_date, end_date):
     current_date = start_date
     while current_date <= end_date:
         day_production = production_entries.filter(
-            entry_datetime__date=current_date
+            **datetime_span('entry_datetime', current_date, current_date)
         ).aggregate(total=Sum('quantity_produced'))['total'] or 0
         daily_production.append(day_production)
         current_date += timedelta(days=1)
@@ -2459,7 +2625,7 @@ def get_analytics_alerts(tenant, start_date, end_date):
     
     production_entries = ProductionEntry.objects.filter(
         tenant=tenant,
-        entry_datetime__date__range=[start_date, end_date]
+        **datetime_span('entry_datetime', start_date, end_date)
     )
     
     # Check for high rejection rates
@@ -2474,7 +2640,7 @@ def get_analytics_alerts(tenant, start_date, end_date):
                 'equipment_code': 'Multiple',
                 'severity': 'HIGH',
                 'message': f'High rejection rate detected: {round(rejection_rate, 1)}%',
-                'timestamp': timezone.now().strftime('%Y-%m-%d %H:%M')
+                'timestamp': get_request_now().strftime('%Y-%m-%d %H:%M')
             })
     
     # Check for equipment with high downtime
@@ -2487,7 +2653,7 @@ def get_analytics_alerts(tenant, start_date, end_date):
             'equipment_code': eq['equipment__equipment_code'],
             'severity': 'MEDIUM',
             'message': f'High downtime: {eq["total_downtime"]} minutes',
-            'timestamp': timezone.now().strftime('%Y-%m-%d %H:%M')
+            'timestamp': get_request_now().strftime('%Y-%m-%d %H:%M')
         })
     
     return alerts
@@ -3,10 +3,20 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional, Tuple
 import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from time import monotonic
 from datetime import date, datetime, timedelta
 import logging
 
-from django.db.models import Sum, F, Q, Case, When, DecimalField
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum, Count, F, Q, Case, When, DecimalField, FloatField
+from django.db.models.functions import Cast, Coalesce
 from django.utils.timezone import make_aware, get_current_timezone
 
 from .llm_utils import call_llm
@@ -16,6 +26,205 @@ from .models import (
     ChartOfAccounts, GLJournal, GLJournalLine
 )
 
+# Parsed intents depend only on the query text, so repeats can skip the LLM
+INTENT_CACHE_TTL = 60 * 60 * 6
+
+# Exact repeats (saved shortcuts, polling widgets) are answered in-process first
+RECENT_INTENTS_MAX_ENTRIES = 2048
+
+# Semantic intent cache: near-duplicate phrasings reuse a parsed intent without the LLM
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_ENTRIES = 5000
+SEMANTIC_CACHE_MODEL = "all-MiniLM-L6-v2"
+
+# Upper bound on rows any handler returns; the LLM-supplied limit is untrusted
+MAX_RESULT_ROWS = 500
+
+# Compound questions run at most this many parts (the top-level intent counts as one)
+MAX_SUB_INTENTS = 4
+
+_YMD_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# domain -> (handler name, takes date_range/group_by/metrics)
+DOMAIN_HANDLERS = {
+    "products": ("_handle_products", False),
+    "inventory": ("_handle_inventory", True),
+    "work_orders": ("_handle_work_orders", True),
+    "production": ("_handle_production", True),
+    "finance": ("_handle_finance", True),
+    "parties": ("_handle_parties", False),
+    "equipment": ("_handle_equipment", True),
+    "employees": ("_handle_employees", False),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class _SemanticIntentCache:
+    """
+    In-process, per-tenant store of (normalized query embedding, intent).
+    Lookup is one matrix-vector product; embeddings are L2-normalized so the
+    dot product is cosine similarity. Oldest entries are evicted past the cap.
+    Intents are stored as JSON so callers always get a private copy.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: Dict[Any, np.ndarray] = {}
+        self._intents: Dict[Any, List[str]] = {}
+
+    def lookup(self, tenant_id, vector: np.ndarray, threshold: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            vectors = self._vectors.get(tenant_id)
+            if vectors is None:
+                return None
+            scores = vectors @ vector
+            best = int(scores.argmax())
+            if scores[best] < threshold:
+                return None
+            raw = self._intents[tenant_id][best]
+        return json.loads(raw)
+
+    def add(self, tenant_id, vector: np.ndarray, intent: Dict[str, Any]) -> None:
+        raw = json.dumps(intent)
+        with self._lock:
+            vectors = self._vectors.get(tenant_id)
+            intents = self._intents.setdefault(tenant_id, [])
+            vectors = vector[None, :] if vectors is None else np.vstack([vectors, vector])
+            intents.append(raw)
+            if len(intents) > self.max_entries:
+                vectors = vectors[-self.max_entries:]
+                del intents[:-self.max_entries]
+            self._vectors[tenant_id] = vectors
+
+
+class _RecentIntents:
+    """
+    Small in-process LRU of (tenant_id, normalized query) -> intent, checked before
+    the shared cache and the embedder. Entries expire with the same TTL as the
+    shared cache. Intents are stored as JSON so callers always get a private copy.
+    """
+
+    def __init__(self, max_entries: int, ttl: float = INTENT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Any, str], Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(raw)
+
+    def put(self, key, intent: Dict[str, Any]) -> None:
+        raw = json.dumps(intent)
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, raw)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_recent_intents = _RecentIntents(RECENT_INTENTS_MAX_ENTRIES)
+_semantic_cache = _SemanticIntentCache(SEMANTIC_CACHE_MAX_ENTRIES)
+_embedder = None
+_embedder_lock = threading.Lock()
+_embedder_unavailable = False
+
+
+def load_semantic_cache_model() -> None:
+    """Load the embedding model up front (called from CoreConfig.ready) so no request pays for it"""
+    global _embedder, _embedder_unavailable
+    with _embedder_lock:
+        if _embedder is not None or _embedder_unavailable:
+            return
+        try:
+            from sentence_transformers import SentenceTransformer
+            ai_settings = getattr(settings, "AI_SETTINGS", None) or {}
+            _embedder = SentenceTransformer(ai_settings.get("SEMANTIC_CACHE_MODEL", SEMANTIC_CACHE_MODEL))
+        except Exception as exc:
+            logger.warning("Semantic intent cache disabled: %s", exc)
+            _embedder_unavailable = True
+
+
+def _embed_query(text: str) -> Optional[np.ndarray]:
+    """L2-normalized query embedding, or None unless the model was loaded at startup"""
+    if _embedder is None:
+        return None
+    return np.asarray(_embedder.encode(text, normalize_embeddings=True), dtype=np.float32)
+
+
+def _semantic_cacheable(intent: Dict[str, Any]) -> bool:
+    """
+    Only generic intents may answer a neighbour's query. Any filter value or date range
+    (preset or absolute) is a slot a near-identical wording can fill differently:
+    "this month" vs "last month", "planned" vs "released", one product name vs another.
+    """
+    for part in [intent] + [i for i in (intent.get("sub_intents") or []) if isinstance(i, dict)]:
+        date_range = part.get("date_range")
+        if isinstance(date_range, dict):
+            if any(date_range.values()):
+                return False
+        elif date_range:
+            return False
+        filters = part.get("filters")
+        if isinstance(filters, dict):
+            if any(filters.values()):
+                return False
+        elif filters:
+            return False
+    return True
+
+
+def _aware(d: date, tz, end_of_day=False) -> datetime:
+    dt = datetime(d.year, d.month, d.day, 23, 59, 59, 999999) if end_of_day else datetime(d.year, d.month, d.day)
+    return make_aware(dt, tz)
+
+
+@lru_cache(maxsize=64)
+def _resolve_preset(today: date, tz, preset: str) -> Optional[Tuple[datetime, datetime]]:
+    """
+    (start, end) for a relative preset. Depends only on the calendar day and
+    timezone, so results are shared until midnight rolls `today` over.
+    """
+    if preset == "today":
+        return (_aware(today, tz), _aware(today, tz, True))
+    if preset == "yesterday":
+        y = today - timedelta(days=1)
+        return (_aware(y, tz), _aware(y, tz, True))
+    if preset == "last_7_days":
+        start = today - timedelta(days=6)
+        return (_aware(start, tz), _aware(today, tz, True))
+    if preset == "last_30_days":
+        start = today - timedelta(days=29)
+        return (_aware(start, tz), _aware(today, tz, True))
+    if preset == "this_month":
+        start = date(today.year, today.month, 1)
+        return (_aware(start, tz), _aware(today, tz, True))
+    if preset == "last_month":
+        first_this = date(today.year, today.month, 1)
+        last_month_end = first_this - timedelta(days=1)
+        last_month_start = date(last_month_end.year, last_month_end.month, 1)
+        return (_aware(last_month_start, tz), _aware(last_month_end, tz, True))
+    if preset == "this_quarter":
+        q_start_month = ((today.month - 1) // 3) * 3 + 1
+        start = date(today.year, q_start_month, 1)
+        return (_aware(start, tz), _aware(today, tz, True))
+    if preset == "this_year":
+        start = date(today.year, 1, 1)
+        return (_aware(start, tz), _aware(today, tz, True))
+
+    return None
+
+
 # -----------------------------
 # ERPAIEngine: Simple. Smart. Strong.
 # -----------------------------
@@ -74,6 +283,19 @@ class ERPAIEngine:
         Ask LLM to translate NL -> intent JSON (domain, action, filters, dates, group_by, metrics).
         Stays lightweight and deterministic; the heavy lifting remains ORM-side.
         """
+        # Exact repeats first: in-process, then the shared cache
+        normalized = " ".join(user_query.lower().split())
+        recent_key = (self.tenant.id, normalized)
+        recent = _recent_intents.get(recent_key)
+        if recent is not None:
+            return recent
+
+        cache_key = f"ai_intent:{self.tenant.id}:{hashlib.md5(normalized.encode()).hexdigest()}"
+        cached = cache.get(cache_key)
+        if cached:
+            _recent_intents.put(recent_key, cached)
+            return cached
+
         system_hints = f"""
 You are an ERP NL->Intent parser. Return STRICT JSON with keys:
 - domain: one of ["products","inventory","work_orders","production","finance","parties","equipment","employees"]
@@ -92,10 +314,25 @@ You are an ERP NL->Intent parser. Return STRICT JSON with keys:
 - group_by: array of strings (e.g., ["category","product_type","warehouse"])
 - limit: integer (optional), default 100
 - order_by: array of strings with optional '-' prefix (e.g., ["-current_stock","sku"])
+- sub_intents: array of intents with the same keys (optional). Only for compound questions spanning
+    several domains (e.g., "inventory and open work orders"): put the first part in the top-level keys
+    and each further part in sub_intents. Omit otherwise.
 
 STRICTLY avoid inventing columns. If the request mentions “Spare Part”, treat as filters.category="Spare Part".
 If unclear, pick the most probable domain and set minimal filters, do not hallucinate.
 """
+        # Near-duplicate phrasings map to the same intent; numbers (dates, codes, top-N)
+        # make a query too specific to answer from a neighbour's intent
+        query_vector = None
+        if not any(ch.isdigit() for ch in normalized):
+            query_vector = _embed_query(normalized)
+        if query_vector is not None:
+            similar = _semantic_cache.lookup(self.tenant.id, query_vector, SEMANTIC_CACHE_THRESHOLD)
+            if similar is not None and _semantic_cacheable(similar):
+                cache.set(cache_key, similar, INTENT_CACHE_TTL)
+                _recent_intents.put(recent_key, similar)
+                return similar
+
         prompt = f"""{system_hints}
 
 USER_QUERY: {user_query}
@@ -105,7 +342,16 @@ Return JSON only."""
         if isinstance(intent, dict) and intent.get("error"):
             # If the LLM wrapper surfaced an error, fall back
             return {}
-        return intent if isinstance(intent, dict) else {}
+        if not isinstance(intent, dict):
+            return {}
+
+        # Only cache usable intents so a transient LLM failure isn't replayed
+        if intent.get("domain"):
+            cache.set(cache_key, intent, INTENT_CACHE_TTL)
+            _recent_intents.put(recent_key, intent)
+            if query_vector is not None and _semantic_cacheable(intent):
+                _semantic_cache.add(self.tenant.id, query_vector, intent)
+        return intent
 
     def _default_backstop_intent(self, user_query: str) -> Dict[str, Any]:
         """
@@ -121,36 +367,56 @@ Return JSON only."""
     # ---------- Intent execution router ----------
 
     def _execute_intent(self, intent: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        sub_intents = [i for i in (intent.get("sub_intents") or []) if isinstance(i, dict) and i.get("domain")]
+        if sub_intents:
+            return self._execute_compound_intent(intent, sub_intents)
+        return self._execute_single_intent(intent)
+
+    def _execute_compound_intent(self, intent: Dict[str, Any], sub_intents: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+        """
+        Answer each part of a compound question in turn on the request's DB connection
+        (short queries; a per-part connection would cost more than it overlaps).
+        Data dicts are merged, summaries joined.
+        """
+        parts = [{k: v for k, v in intent.items() if k != "sub_intents"}]
+        parts += [{k: v for k, v in i.items() if k != "sub_intents"} for i in sub_intents]
+        parts = parts[:MAX_SUB_INTENTS]
+
+        data: Dict[str, Any] = {}
+        summaries = []
+        for part in parts:
+            part_data, part_summary = self._execute_single_intent(part)
+            for key, value in part_data.items():
+                # Two parts on the same domain keep both result sets
+                merged_key = key
+                n = 2
+                while merged_key in data:
+                    merged_key = f"{key}_{n}"
+                    n += 1
+                data[merged_key] = value
+            summaries.append(part_summary)
+        return data, " ".join(summaries)
+
+    def _execute_single_intent(self, intent: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
         domain = intent.get("domain")
         action = intent.get("action", "list")
         filters = intent.get("filters", {}) or {}
-        date_range = self._resolve_date_range(intent.get("date_range"))
-        group_by = intent.get("group_by") or []
-        metrics = intent.get("metrics") or []
-        limit = int(intent.get("limit") or 100)
+        limit = min(max(int(intent.get("limit") or 100), 1), MAX_RESULT_ROWS)
         order_by = intent.get("order_by") or []
 
-        if domain == "products":
-            return self._handle_products(action, filters, limit, order_by)
-        if domain == "inventory":
-            return self._handle_inventory(action, filters, date_range, group_by, metrics, limit, order_by)
-        if domain == "work_orders":
-            return self._handle_work_orders(action, filters, date_range, group_by, metrics, limit, order_by)
-        if domain == "production":
-            return self._handle_production(action, filters, date_range, group_by, metrics, limit, order_by)
-        if domain == "finance":
-            return self._handle_finance(action, filters, date_range, group_by, metrics, limit, order_by)
-        if domain == "parties":
-            return self._handle_parties(action, filters, limit, order_by)
-        if domain == "equipment":
-            return self._handle_equipment(action, filters, date_range, group_by, metrics, limit, order_by)
-
+        if domain not in DOMAIN_HANDLERS:
+            # Unknown domain -> default to product list
+            return self._handle_products("list", filters, limit, order_by)
 
-        if domain == "employees":
-            return self._handle_employees(action, filters, limit, order_by)
+        handler_name, takes_ranges = DOMAIN_HANDLERS[domain]
+        handler = getattr(self, handler_name)
+        if not takes_ranges:
+            return handler(action, filters, limit, order_by)
 
-        # Unknown domain -> default to product list
-        return self._handle_products("list", filters, limit, order_by)
+        date_range = self._resolve_date_range(intent.get("date_range"))
+        group_by = intent.get("group_by") or []
+        metrics = intent.get("metrics") or []
+        return handler(action, filters, date_range, group_by, metrics, limit, order_by)
 
     # ---------- Helpers: date ranges, serialization, stock math ----------
 
@@ -163,70 +429,27 @@ Return JSON only."""
         if not dr:
             return None
 
-        now = datetime.now(self.tz)
-        today = now.date()
-
-        def mk_aware(d: date, end_of_day=False) -> datetime:
-            dt = datetime(d.year, d.month, d.day, 23, 59, 59, 999999) if end_of_day else datetime(d.year, d.month, d.day)
-            return make_aware(dt, self.tz)
-
         if "from" in dr and "to" in dr and self._is_ymd(dr["from"]) and self._is_ymd(dr["to"]):
-            start = mk_aware(datetime.strptime(dr["from"], "%Y-%m-%d").date())
-            end = mk_aware(datetime.strptime(dr["to"], "%Y-%m-%d").date(), end_of_day=True)
+            start = _aware(datetime.strptime(dr["from"], "%Y-%m-%d").date(), self.tz)
+            end = _aware(datetime.strptime(dr["to"], "%Y-%m-%d").date(), self.tz, end_of_day=True)
             return (start, end)
 
         preset = (dr.get("preset") or "").lower()
         if not preset:
             return None
 
-        if preset == "today":
-            return (mk_aware(today), mk_aware(today, True))
-        if preset == "yesterday":
-            y = today - timedelta(days=1)
-            return (mk_aware(y), mk_aware(y, True))
-        if preset == "last_7_days":
-            start = today - timedelta(days=6)
-            return (mk_aware(start), mk_aware(today, True))
-        if preset == "last_30_days":
-            start = today - timedelta(days=29)
-            return (mk_aware(start), mk_aware(today, True))
-        if preset == "this_month":
-            start = date(today.year, today.month, 1)
-            return (mk_aware(start), mk_aware(today, True))
-        if preset == "last_month":
-            first_this = date(today.year, today.month, 1)
-            last_month_end = first_this - timedelta(days=1)
-            last_month_start = date(last_month_end.year, last_month_end.month, 1)
-            return (mk_aware(last_month_start), mk_aware(last_month_end, True))
-        if preset == "this_quarter":
-            q_start_month = ((today.month - 1) // 3) * 3 + 1
-            start = date(today.year, q_start_month, 1)
-            return (mk_aware(start), mk_aware(today, True))
-        if preset == "this_year":
-            start = date(today.year, 1, 1)
-            return (mk_aware(start), mk_aware(today, True))
-
-        return None
+        return _resolve_preset(datetime.now(self.tz).date(), self.tz, preset)
 
     def _is_ymd(self, s: str) -> bool:
-        return bool(re.fullmatch(r"\d{4}-\d{2}-\d{2}", s))
+        return _YMD_RE.fullmatch(s) is not None
 
     def _serialize(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Convert Decimals/DateTimes to JSON-safe primitives.
+        Rows are returned as-is: the API's ORJSONRenderer encodes dates/datetimes
+        natively and Decimals through DRF's encoder hook, in a single C pass at
+        response time instead of a per-cell rebuild here.
         """
-        out = []
-        for r in rows:
-            item = {}
-            for k, v in r.items():
-                if hasattr(v, "isoformat"):
-                    item[k] = v.isoformat()
-                elif type(v).__name__ == "Decimal":
-                    item[k] = float(v)
-                else:
-                    item[k] = v
-            out.append(item)
-        return out
+        return rows
 
     def _stock_balance_annotation(self, date_range: Optional[Tuple[datetime, datetime]] = None):
         """
@@ -429,17 +652,18 @@ Return JSON only."""
         rows = list(qs.values(*values)[:limit])
         data = {"production_entries": self._serialize(rows)}
 
-        # Optional KPI summary if requested
-        kpi_bits = []
+        # Optional KPI summary if requested, totalled in SQL over every matching entry (not just the listed page)
+        kpi_fields = []
         if not metrics or "output" in metrics or "quantity_produced" in metrics:
-            produced = sum([r.get("quantity_produced") or 0 for r in rows])
-            kpi_bits.append(f"produced={produced}")
+            kpi_fields.append(("produced", "quantity_produced"))
         if not metrics or "rejections" in metrics or "quantity_rejected" in metrics:
-            rejected = sum([r.get("quantity_rejected") or 0 for r in rows])
-            kpi_bits.append(f"rejected={rejected}")
+            kpi_fields.append(("rejected", "quantity_rejected"))
         if not metrics or "downtime_minutes" in metrics:
-            downtime = sum([r.get("downtime_minutes") or 0 for r in rows])
-            kpi_bits.append(f"downtime_min={downtime}")
+            kpi_fields.append(("downtime_min", "downtime_minutes"))
+        kpis = qs.aggregate(**{label: Sum(field) for label, field in kpi_fields}) if kpi_fields else {}
+        kpis = {label: kpis[label] or 0 for label, _ in kpi_fields}
+        data["kpis"] = kpis
+        kpi_bits = [f"{label}={value}" for label, value in kpis.items()]
 
         drt = self._date_range_text(date_range)
         summary = f"Production entries: {', '.join(kpi_bits)}"
@@ -476,13 +700,16 @@ Return JSON only."""
 
         rows = list(jl.values(*values)[:limit])
 
-        # Optional grouped KPI
-        total_debit = sum([r.get("debit_amount") or 0 for r in rows])
-        total_credit = sum([r.get("credit_amount") or 0 for r in rows])
+        # Optional grouped KPI, totalled in SQL over every matching line
+        totals = jl.aggregate(debit=Sum("debit_amount"), credit=Sum("credit_amount"), lines=Count("id"))
+        total_debit = totals["debit"] or 0
+        total_credit = totals["credit"] or 0
+        total_lines = totals["lines"]
 
         data = {
             "journal_lines": self._serialize(rows),
-            "summary": {"total_debit": float(total_debit), "total_credit": float(total_credit)}
+            "summary": {"total_debit": float(total_debit), "total_credit": float(total_credit)},
+            "kpis": {"debit": total_debit, "credit": total_credit, "lines": total_lines},
         }
 
         drt = self._date_range_text(date_range)
@@ -492,7 +719,10 @@ Return JSON only."""
         if filters.get("cost_center_code"):
             scope.append(f"cost_center '{filters['cost_center_code']}'")
         suffix = f" {drt}" if drt else ""
-        summary = f"Finance lines: {len(rows)} row(s), debit={total_debit}, credit={total_credit}{suffix}."
+        summary = (
+            f"Finance lines: showing {len(rows)} of {total_lines} row(s); "
+            f"totals over all {total_lines}: debit={total_debit}, credit={total_credit}{suffix}."
+        )
         if scope:
             summary += f" Filtered by {', '.join(scope)}."
         return data, summary
@@ -561,81 +791,30 @@ Return JSON only."""
             if ob.lstrip("-") == "downtime_minutes":
                 wants_downtime = True
 
-        # If downtime aggregation requested -> aggregate from ProductionEntry
+        # If downtime aggregation requested -> annotate it onto the equipment query (one JOIN, no stitching)
         if wants_downtime:
-            pe_qs = ProductionEntry.objects.filter(tenant=self.tenant).select_related("equipment")
+            in_scope = Q(productionentry__tenant=self.tenant)
             if date_range:
                 start, end = date_range
-                pe_qs = pe_qs.filter(entry_datetime__gte=start, entry_datetime__lte=end)
-
-            # Sum downtime per equipment
-            from django.db.models import Sum
-            agg = pe_qs.values("equipment__id", "equipment__equipment_code", "equipment__equipment_name") \
-                        .annotate(total_downtime=Sum("downtime_minutes"))
-
-            # Order by requested order_by if it mentions downtime, else by total_downtime desc
-            # Convert Django-style order_by list into workable ordering
-            if cleaned_order_by:
-                # if user requested ordering by downtime, apply; else default to -total_downtime
-                if any(o.lstrip("-") == "downtime_minutes" for o in cleaned_order_by):
-                    # translate -downtime_minutes -> '-total_downtime'
-                    new_order = []
-                    for o in cleaned_order_by:
-                        if o.lstrip("-") == "downtime_minutes":
-                            if o.startswith("-"):
-                                new_order.append("-total_downtime")
-                            else:
-                                new_order.append("total_downtime")
-                        else:
-                            # For other fields, we need to check if they're available in the aggregation
-                            if o.lstrip("-") in ["equipment_code", "equipment_name"]:
-                                # These are available via the equipment__ prefix
-                                field_name = o.lstrip("-")
-                                prefix = "-" if o.startswith("-") else ""
-                                new_order.append(f"{prefix}equipment__{field_name}")
-                    agg = agg.order_by(*new_order)
-                else:
-                    agg = agg.order_by("-total_downtime")
+                in_scope &= Q(productionentry__entry_datetime__gte=start, productionentry__entry_datetime__lte=end)
+
+            eq_qs = eq_qs.annotate(total_downtime_minutes=Cast(
+                Coalesce(Sum("productionentry__downtime_minutes", filter=in_scope), 0),
+                FloatField()
+            ))
+
+            # Order by requested downtime direction, else by total downtime desc
+            if any(o.lstrip("-") == "downtime_minutes" for o in cleaned_order_by):
+                eq_qs = eq_qs.order_by(*[
+                    o.replace("downtime_minutes", "total_downtime_minutes") for o in cleaned_order_by
+                ])
             else:
-                agg = agg.order_by("-total_downtime")
-
-            # Limit and build results
-            agg = list(agg[:limit])
-
-            equipment_ids = [a.get("equipment__id") for a in agg if a.get("equipment__id")]
-            # get equipment core fields for those ids
-            eq_rows = {}
-            if equipment_ids:
-                rows = list(eq_qs.filter(id__in=equipment_ids).values(
-                    "id", "equipment_code", "equipment_name", "location", "capacity_per_hour",
-                    "acquisition_date", "last_maintenance", "next_maintenance"
-                ))
-                eq_rows = {r["id"]: r for r in rows}
-
-            result_rows = []
-            for a in agg:
-                eid = a.get("equipment__id")
-                base = eq_rows.get(eid, {
-                    "equipment_code": a.get("equipment__equipment_code"),
-                    "equipment_name": a.get("equipment__equipment_name"),
-                    "location": None,
-                    "capacity_per_hour": None,
-                    "acquisition_date": None,
-                    "last_maintenance": None,
-                    "next_maintenance": None
-                })
-                # attach aggregated downtime
-                base_row = {
-                    "equipment_code": base.get("equipment_code"),
-                    "equipment_name": base.get("equipment_name"),
-                    "location": base.get("location"),
-                    "capacity_per_hour": base.get("capacity_per_hour"),
-                    "acquisition_date": base.get("acquisition_date"),
-                    "last_maintenance": base.get("last_maintenance"),
-                    "next_maintenance": base.get("next_maintenance"),
-                    "total_downtime_minutes": float(a.get("total_downtime") or 0)
-                }
-                result_rows.append(base_row)
+                eq_qs = eq_qs.order_by("-total_downtime_minutes")
+
+            result_rows = list(eq_qs.values(
+                "equipment_code", "equipment_name", "location", "capacity_per_hour",
+                "acquisition_date", "last_maintenance", "next_maintenance", "total_downtime_minutes"
+            )[:limit])
 
             data = {"equipment": self._serialize(result_rows)}
             summary = f"Found {len(result_rows)} equipment rows annotated with total_downtime_minutes"
@@ -653,7 +832,7 @@ Return JSON only."""
         return data, summary
 
     def _handle_employees(self, action, filters, limit, order_by):
-        qs = Employee.objects.filter(tenant=self.tenant, is_active=True).select_related("cost_center")
+        qs = Employee.objects.filter(tenant=self.tenant, is_active=True)
         if filters.get("text"):
             t = filters["text"]
             qs = qs.filter(Q(employee_code__icontains=t) | Q(full_name__icontains=t) | Q(department__icontains=t) | Q(designation__icontains=t))
@@ -686,17 +865,14 @@ Return JSON only."""
             if domain not in ["production", "work_orders", "inventory", "finance"]:
                 return None
 
-            produced = rejected = downtime = 0
-            if domain == "production":
-                rows = data.get("production_entries", []) or []
-                produced = sum([r.get("quantity_produced") or 0 for r in rows])
-                rejected = sum([r.get("quantity_rejected") or 0 for r in rows])
-                downtime = sum([r.get("downtime_minutes") or 0 for r in rows])
+            # Totals computed in SQL by the handler over every matching row, not the listed page
+            kpis = data.get("kpis") or {}
+            kpi_text = ", ".join(f"{label}={value}" for label, value in kpis.items()) or "n/a"
 
             prompt = f"""
     DOMAIN: {domain}
     SUMMARY: {summary}
-    KPI: produced={produced}, rejected={rejected}, downtime_min={downtime}
+    KPI: {kpi_text}
 
     Task: In 1–2 sentences, say if results are good or bad overall, 
     and suggest one improvement if needed. Keep it professional.
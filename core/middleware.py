@@ -2,6 +2,7 @@
 from django.core.cache import cache
 from django.http import HttpResponseForbidden, JsonResponse, HttpResponseServerError
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from .models import Tenant, TenantUser
 import threading
 from django.db import OperationalError
@@ -92,6 +93,32 @@ def get_current_tenant():
     return getattr(_thread_local, "tenant", None)
 
 
+class RequestClockMiddleware:
+    """
+    Pin one timezone.now() per request so every helper building a response
+    (dashboard sections, schedules, alerts) agrees on "now" and "today".
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.now = _thread_local.now = timezone.now()
+        try:
+            return self.get_response(request)
+        finally:
+            try:
+                delattr(_thread_local, "now")
+            except AttributeError:
+                pass
+
+
+def get_request_now():
+    """Request-pinned current time; falls back to timezone.now() outside a request"""
+    now = getattr(_thread_local, "now", None)
+    return now if now is not None else timezone.now()
+
+
 # Custom Manager for automatic tenant filtering
 from django.db import models
 
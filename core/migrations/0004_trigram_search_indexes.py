@@ -0,0 +1,34 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_product_primary_image_purchaseorder_po_document_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='product',
+            index=GinIndex(fields=['sku'], name='product_sku_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=GinIndex(fields=['product_name'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=GinIndex(fields=['display_name'], name='party_display_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=GinIndex(fields=['wo_number'], name='workorder_wo_number_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='gljournal',
+            index=GinIndex(fields=['journal_number'], name='gljournal_number_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
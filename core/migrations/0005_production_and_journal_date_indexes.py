@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productionentry',
+            index=models.Index(fields=['tenant', 'entry_datetime'], name='prodentry_tenant_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productionentry',
+            index=models.Index(fields=['tenant', 'equipment', 'entry_datetime'], name='prodentry_tenant_eq_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gljournal',
+            index=models.Index(fields=['tenant', 'posting_date', 'status'], name='gljournal_tenant_date_idx'),
+        ),
+    ]
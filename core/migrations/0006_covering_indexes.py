@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_production_and_journal_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(
+                fields=['tenant', 'status', 'due_date'],
+                include=['wo_number', 'priority', 'quantity_planned', 'quantity_completed',
+                         'quantity_scrapped', 'product', 'cost_center'],
+                name='workorder_status_due_cov',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='gljournalline',
+            index=models.Index(
+                fields=['tenant', 'journal'],
+                include=['account', 'debit_amount', 'credit_amount'],
+                name='gljline_tenant_journal_cov',
+            ),
+        ),
+    ]
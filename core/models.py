@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MinValueValidator, FileExtensionValidator
 from django.utils import timezone
 import os
@@ -172,6 +173,11 @@ class Product(BaseModel):
     
     class Meta:
         unique_together = ['tenant', 'sku']
+        indexes = [
+            # Trigram indexes back the icontains searches in admin and the product APIs
+            GinIndex(fields=['sku'], name='product_sku_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['product_name'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+        ]
     
     def __str__(self):
         return f"{self.sku} - {self.product_name}"
@@ -226,6 +232,9 @@ class Party(BaseModel):
     class Meta:
         unique_together = ['tenant', 'party_code']
         verbose_name_plural = 'Parties'
+        indexes = [
+            GinIndex(fields=['display_name'], name='party_display_name_trgm', opclasses=['gin_trgm_ops']),
+        ]
     
     def __str__(self):
         return f"{self.party_code} - {self.display_name}"
@@ -324,6 +333,16 @@ class WorkOrder(BaseModel):
     
     class Meta:
         unique_together = ['tenant', 'wo_number']
+        indexes = [
+            GinIndex(fields=['wo_number'], name='workorder_wo_number_trgm', opclasses=['gin_trgm_ops']),
+            # Covers the AI work-order listing (status/due-date filter + its selected columns)
+            models.Index(
+                fields=['tenant', 'status', 'due_date'],
+                include=['wo_number', 'priority', 'quantity_planned', 'quantity_completed',
+                         'quantity_scrapped', 'product', 'cost_center'],
+                name='workorder_status_due_cov'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.wo_number} - {self.product.sku}"
@@ -346,6 +365,12 @@ class ProductionEntry(BaseModel):
     downtime_reason = models.CharField(max_length=200, blank=True)
     shift = models.CharField(max_length=20)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'entry_datetime'], name='prodentry_tenant_dt_idx'),
+            models.Index(fields=['tenant', 'equipment', 'entry_datetime'], name='prodentry_tenant_eq_dt_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.work_order.wo_number} - {self.entry_datetime}"
 
@@ -409,6 +434,10 @@ class GLJournal(BaseModel):
     
     class Meta:
         unique_together = ['tenant', 'journal_number']
+        indexes = [
+            GinIndex(fields=['journal_number'], name='gljournal_number_trgm', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['tenant', 'posting_date', 'status'], name='gljournal_tenant_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.journal_number} - {self.posting_date}"
@@ -425,6 +454,14 @@ class GLJournalLine(BaseModel):
     
     class Meta:
         unique_together = ['tenant', 'journal', 'line_number']
+        indexes = [
+            # Lets debit/credit totals per journal be read without heap fetches
+            models.Index(
+                fields=['tenant', 'journal'],
+                include=['account', 'debit_amount', 'credit_amount'],
+                name='gljline_tenant_journal_cov'
+            ),
+        ]
 
 # ===== PURCHASE ORDERS =====
 class PurchaseOrder(BaseModel):
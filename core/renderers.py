@@ -0,0 +1,26 @@
+# core/renderers.py - API Response Renderers
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# DRF's encoder covers what orjson can't (Decimal, lazy strings, querysets, ...)
+_drf_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer backed by orjson.
+    Large analytics payloads (rejection/OEE trends, valuations) spend most of
+    their render time in the stdlib encoder; orjson does the same in C.
+    """
+    options = (
+        orjson.OPT_NON_STR_KEYS      # json.dumps stringifies int/date keys too
+        | orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_UTC_Z           # match DRF's "...Z" for UTC datetimes
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_drf_default, option=self.options)
@@ -1,3 +1,579 @@
-from django.test import TestCase
+import queue
+import random
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import force_authenticate
+
+from . import business_views, enhanced_ai_engine, utils
+from .enhanced_ai_engine import MAX_SUB_INTENTS, ERPAIEngine
+from .business_views import _cached_dashboard_section, calculate_urgency_score, classify_abc, trend_period_layout
+from .models import (
+    CostCenter, Employee, Equipment, GLJournal, Product, ProductionEntry,
+    StockMovement, Tenant, Warehouse, WorkOrder
+)
+from .utils import calculate_oee, calculate_oee_bulk, cached_inventory_valuation
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def baseline_abc(values):
+    """The original sort-and-loop ABC classification, as (index, class, cumulative %) rows"""
+    items = sorted(enumerate(values), key=lambda x: x[1], reverse=True)
+    total_value = sum(value for _, value in items)
+    rows = []
+    cumulative_value = 0.0
+    for idx, value in items:
+        cumulative_value += value
+        cumulative_pct = (cumulative_value / max(total_value, 1)) * 100
+        if cumulative_pct <= 80:
+            classification = 'A'
+        elif cumulative_pct <= 95:
+            classification = 'B'
+        else:
+            classification = 'C'
+        rows.append((idx, classification, round(cumulative_pct, 2)))
+    return rows
+
+
+def baseline_trend_periods(start_date, end_date):
+    """The original per-period loop in get_financial_trends_data, as (start, end) pairs"""
+    periods = []
+    current_date = start_date
+    days_in_period = (end_date - start_date).days
+    interval_days = max(1, days_in_period // 4)
+    while current_date <= end_date:
+        periods.append((current_date, min(current_date + timedelta(days=interval_days), end_date)))
+        current_date += timedelta(days=interval_days + 1)
+    return periods
+
+
+def baseline_urgency(days_to_due, priority):
+    if days_to_due <= 0:
+        urgency = 100
+    elif days_to_due <= 1:
+        urgency = 90
+    elif days_to_due <= 3:
+        urgency = 70
+    elif days_to_due <= 7:
+        urgency = 50
+    else:
+        urgency = 20
+    return min(100, urgency + (11 - priority) * 5)
+
+
+class ClassifyABCTests(SimpleTestCase):
+    def assertMatchesBaseline(self, values):
+        order, _, _, cumulative_pct, classifications = classify_abc(values)
+        rows = [
+            (idx, cls, round(pct, 2))
+            for idx, cls, pct in zip(order.tolist(), classifications.tolist(), cumulative_pct.tolist())
+        ]
+        self.assertEqual(rows, baseline_abc(values))
+
+    def test_exact_threshold_shares_stay_in_the_lower_class(self):
+        order, _, _, cumulative_pct, classifications = classify_abc([5.0, 80.0, 15.0])
+        self.assertEqual(order.tolist(), [1, 2, 0])
+        self.assertEqual(cumulative_pct.tolist(), [80.0, 95.0, 100.0])
+        self.assertEqual(classifications.tolist(), ['A', 'B', 'C'])
+        self.assertMatchesBaseline([5.0, 80.0, 15.0])
+
+    def test_just_past_thresholds(self):
+        self.assertMatchesBaseline([81.0, 15.0, 4.0])
+        self.assertMatchesBaseline([79.0, 17.0, 4.0])
+        self.assertMatchesBaseline([50.0, 30.0, 15.0, 5.0])
+
+    def test_ties_keep_input_order(self):
+        order, _, _, _, _ = classify_abc([10.0, 10.0, 10.0])
+        self.assertEqual(order.tolist(), [0, 1, 2])
+        self.assertMatchesBaseline([10.0, 10.0, 10.0])
+
+    def test_total_below_one_is_not_scaled_up(self):
+        self.assertMatchesBaseline([0.5, 0.25])
+        self.assertMatchesBaseline([0.0, 0.0, 3.0])
+
+    def test_float_shares_on_the_thresholds_match_baseline(self):
+        # Running sums land on (or a rounding step off) 80% and 95%; the class must follow the baseline's sums
+        self.assertMatchesBaseline([70.1, 9.9, 15.0, 5.0])
+        self.assertMatchesBaseline([0.1, 0.7, 0.15, 0.05])
+        self.assertMatchesBaseline([26.7, 26.7, 26.6, 15.0, 5.0])
+        self.assertMatchesBaseline([1e16, 1.0, 2.5e15, 1.0, 1.0])
+
+    def test_total_is_the_baseline_sequential_sum(self):
+        values = [0.1] * 10 + [0.7, 1e-17]
+        _, _, total_value, _, _ = classify_abc(values)
+        self.assertEqual(total_value, sum(sorted(values, reverse=True)))
+
+    def test_random_float_catalogues_match_baseline(self):
+        rng = random.Random(20240502)
+        for _ in range(200):
+            values = [round(rng.uniform(0, 1000), 2) for _ in range(rng.randint(1, 60))]
+            self.assertMatchesBaseline(values)
+
+    def test_random_catalogues_match_baseline(self):
+        rng = random.Random(20240501)
+        for _ in range(200):
+            values = [float(rng.randint(0, 1000)) for _ in range(rng.randint(1, 60))]
+            self.assertMatchesBaseline(values)
+
+
+class TrendPeriodLayoutTests(SimpleTestCase):
+    def test_days_map_to_the_baseline_periods(self):
+        start_date = date(2024, 1, 1)
+        for span in range(0, 120):
+            end_date = start_date + timedelta(days=span)
+            periods = baseline_trend_periods(start_date, end_date)
+            step, period_count = trend_period_layout(start_date, end_date)
+
+            self.assertEqual(period_count, len(periods), span)
+            for idx, (period_start, _) in enumerate(periods):
+                self.assertEqual(start_date + timedelta(days=idx * step), period_start, span)
+            for offset in range(span + 1):
+                day = start_date + timedelta(days=offset)
+                period_start, period_end = periods[offset // step]
+                self.assertTrue(period_start <= day <= period_end, (span, offset))
+
+    def test_bucket_edges(self):
+        # 8 days -> interval 2, step 3: days 0-2, 3-5, 6-8
+        self.assertEqual(trend_period_layout(date(2024, 1, 1), date(2024, 1, 9)), (3, 3))
+        # Single day -> one period
+        self.assertEqual(trend_period_layout(date(2024, 1, 1), date(2024, 1, 1)), (2, 1))
+
+
+class UrgencyScoreTests(SimpleTestCase):
+    def test_matches_baseline_across_band_edges(self):
+        today = date(2024, 6, 15)
+        for days_to_due in range(-3, 12):
+            for priority in range(1, 11):
+                work_order = SimpleNamespace(due_date=today + timedelta(days=days_to_due), priority=priority)
+                self.assertEqual(
+                    calculate_urgency_score(work_order, today=today),
+                    baseline_urgency(days_to_due, priority),
+                    (days_to_due, priority)
+                )
+
+    def test_band_edges(self):
+        today = date(2024, 6, 15)
+        scores = {
+            days: calculate_urgency_score(SimpleNamespace(due_date=today + timedelta(days=days), priority=10), today=today)
+            for days in (0, 1, 2, 3, 4, 7, 8)
+        }
+        self.assertEqual(scores, {0: 100, 1: 95, 2: 75, 3: 75, 4: 55, 7: 55, 8: 25})
+
+
+class ERPFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(company_name='Test Works', subdomain='testworks')
+        cls.cost_center = CostCenter.objects.create(tenant=cls.tenant, cost_center_code='CC1', name='Plant')
+        cls.operator = Employee.objects.create(
+            tenant=cls.tenant, employee_code='E1', full_name='Operator One', department='Production',
+            designation='Operator', cost_center=cls.cost_center, hire_date=date(2020, 1, 1)
+        )
+        cls.product = Product.objects.create(
+            tenant=cls.tenant, sku='SKU-1', product_name='Bracket', product_type='finished_good',
+            uom='pcs', category='Hardware'
+        )
+        cls.warehouse = Warehouse.objects.create(
+            tenant=cls.tenant, warehouse_code='WH1', warehouse_name='Main', location='Site'
+        )
+        cls.work_order = WorkOrder.objects.create(
+            tenant=cls.tenant, wo_number='WO-1', product=cls.product, quantity_planned=100,
+            due_date=date(2024, 6, 30), cost_center=cls.cost_center
+        )
+        cls.press = Equipment.objects.create(
+            tenant=cls.tenant, equipment_code='EQ1', equipment_name='Press', location='Bay 1',
+            capacity_per_hour=50, acquisition_date=date(2020, 1, 1)
+        )
+        cls.lathe = Equipment.objects.create(
+            tenant=cls.tenant, equipment_code='EQ2', equipment_name='Lathe', location='Bay 2',
+            capacity_per_hour=20, acquisition_date=date(2020, 1, 1)
+        )
+
+    def production_entry(self, equipment, local_dt, produced, rejected=0, downtime=0):
+        return ProductionEntry.objects.create(
+            tenant=self.tenant, work_order=self.work_order, equipment=equipment, operator=self.operator,
+            entry_datetime=timezone.make_aware(local_dt), quantity_produced=produced,
+            quantity_rejected=rejected, downtime_minutes=downtime, shift='A'
+        )
+
+
+class BulkOEETests(ERPFixtureMixin, TestCase):
+    def test_bulk_matches_per_equipment_oee(self):
+        start_date = date(2024, 6, 10)
+        end_date = date(2024, 6, 13)
+        self.production_entry(self.press, datetime(2024, 6, 10, 9), 45, rejected=3, downtime=10)
+        self.production_entry(self.press, datetime(2024, 6, 10, 10), 50)
+        self.production_entry(self.press, datetime(2024, 6, 11, 0, 15), 20, downtime=30)  # just after local midnight
+        self.production_entry(self.press, datetime(2024, 6, 12, 23, 45), 40, rejected=5)  # just before local midnight
+        self.production_entry(self.lathe, datetime(2024, 6, 12, 14), 18, rejected=1, downtime=5)
+        self.production_entry(self.lathe, datetime(2024, 6, 14, 8), 10)  # outside the range
+
+        bulk = calculate_oee_bulk([self.press, self.lathe], start_date, end_date)
+
+        day = start_date
+        while day <= end_date:
+            for equipment in (self.press, self.lathe):
+                self.assertEqual(bulk[(equipment.id, day)], calculate_oee(equipment, day), (equipment.equipment_code, day))
+            day += timedelta(days=1)
+        self.assertEqual(len(bulk), 8)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheVersionInvalidationTests(ERPFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build_section(self, tenant, start_date, end_date):
+        self.builds += 1
+        return self.builds
+
+    def cached_section(self):
+        day = date(2024, 6, 10)
+        return _cached_dashboard_section('test_section', self.build_section, self.tenant, day, day)
+
+    def stock_movement(self, quantity):
+        return StockMovement.objects.create(
+            tenant=self.tenant, movement_number=f'REC-{quantity}', movement_type='receipt',
+            product=self.product, warehouse=self.warehouse, quantity=Decimal(quantity),
+            unit_cost=Decimal('2.5'), movement_date=timezone.make_aware(datetime.combine(date(2024, 6, 1), time(9)))
+        )
+
+    def current_qty(self):
+        return cached_inventory_valuation(self.tenant, date(2024, 6, 10))['details']['SKU-1']['current_qty']
+
+    def test_stock_movement_save_and_delete_refresh_valuation(self):
+        self.assertEqual(self.current_qty(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movement = self.stock_movement(10)
+        self.assertEqual(self.current_qty(), 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movement.delete()
+        self.assertEqual(self.current_qty(), 0)
+
+    def test_production_entry_save_and_delete_rebuild_analysis(self):
+        self.assertEqual(self.cached_section(), 1)
+        self.assertEqual(self.cached_section(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = self.production_entry(self.press, datetime(2024, 6, 10, 9), 40)
+        self.assertEqual(self.cached_section(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.delete()
+        self.assertEqual(self.cached_section(), 3)
+
+    def test_gl_journal_save_rebuilds_analysis(self):
+        self.assertEqual(self.cached_section(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            journal = GLJournal.objects.create(tenant=self.tenant, journal_number='GL-1', posting_date=date(2024, 6, 10))
+        self.assertEqual(self.cached_section(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            journal.status = 'posted'
+            journal.save()
+        self.assertEqual(self.cached_section(), 3)
+
+    def test_master_data_edits_rebuild_analysis(self):
+        self.assertEqual(self.cached_section(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.press.capacity_per_hour = 60
+            self.press.save()
+        self.assertEqual(self.cached_section(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.operator.hourly_rate = Decimal('250')
+            self.operator.save()
+        self.assertEqual(self.cached_section(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cost_center.name = 'Plant A'
+            self.cost_center.save()
+        self.assertEqual(self.cached_section(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lathe.delete()
+        self.assertEqual(self.cached_section(), 5)
+
+    def test_version_is_not_bumped_before_commit(self):
+        self.assertEqual(self.cached_section(), 1)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.production_entry(self.press, datetime(2024, 6, 10, 9), 40)
+        self.assertEqual(self.cached_section(), 1)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.cached_section(), 2)
+
+
+class EndlessQueue:
+    """Always has a row ready; records the timeout of every get()"""
+
+    def __init__(self):
+        self.timeouts = []
+
+    def get(self, timeout=None):
+        self.timeouts.append(timeout)
+        return {'user_query': f'q{len(self.timeouts)}'}
+
+
+class AIQueryLogQueueTests(SimpleTestCase):
+    def test_batch_closes_at_one_deadline_from_its_first_row(self):
+        rows = EndlessQueue()
+        with mock.patch.object(utils, '_ai_log_queue', rows), \
+                mock.patch.object(utils, 'monotonic', side_effect=[10.0, 10.1, 10.3, 10.6]):
+            batch = utils._next_ai_query_log_batch()
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(rows.timeouts[0], utils.AI_LOG_FLUSH_INTERVAL)
+        self.assertAlmostEqual(rows.timeouts[1], 0.4)
+        self.assertAlmostEqual(rows.timeouts[2], 0.2)
+
+    def test_idle_queue_yields_an_empty_batch(self):
+        with mock.patch.object(utils, '_ai_log_queue', queue.Queue()), \
+                mock.patch.object(utils, 'AI_LOG_FLUSH_INTERVAL', 0.01):
+            self.assertEqual(utils._next_ai_query_log_batch(), [])
+
+    def test_full_queue_falls_back_to_a_direct_insert(self):
+        full = queue.Queue(maxsize=1)
+        full.put_nowait({'user_query': 'queued'})
+        with mock.patch.object(utils, '_ai_log_queue', full), \
+                mock.patch.object(utils, '_ai_log_writer', object()), \
+                mock.patch.object(utils, 'AIQueryLog') as model:
+            utils.log_ai_query(user_query='overflow')
+
+        model.objects.create.assert_called_once_with(user_query='overflow')
+        self.assertEqual(full.qsize(), 1)
+
+    def test_exit_flush_writes_queued_rows_after_the_in_flight_batch(self):
+        pending = queue.Queue()
+        for n in range(3):
+            pending.put_nowait({'user_query': f'q{n}'})
+        batch_lock = threading.Lock()
+        stopping = threading.Event()
+
+        with mock.patch.object(utils, '_ai_log_queue', pending), \
+                mock.patch.object(utils, '_ai_log_batch_lock', batch_lock), \
+                mock.patch.object(utils, '_ai_log_stopping', stopping), \
+                mock.patch.object(utils, '_write_ai_query_logs') as write:
+            batch_lock.acquire()  # the writer is mid-batch
+            flusher = threading.Thread(target=utils._flush_ai_query_logs)
+            flusher.start()
+            flusher.join(timeout=0.2)
+            self.assertTrue(flusher.is_alive())
+            self.assertTrue(stopping.is_set())
+            write.assert_not_called()
+
+            batch_lock.release()
+            flusher.join(timeout=5)
+            self.assertFalse(flusher.is_alive())
+
+        write.assert_called_once_with([{'user_query': 'q0'}, {'user_query': 'q1'}, {'user_query': 'q2'}])
+
+
+class CompoundIntentTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = ERPAIEngine(SimpleNamespace(id=1), None)
+        self.calls = []
+
+    def fake_single_intent(self, intent):
+        self.calls.append(intent)
+        domain = intent["domain"]
+        return {domain: [len(self.calls)], "kpis": {"part": len(self.calls)}}, f"{domain} #{len(self.calls)}."
+
+    def execute(self, intent):
+        with mock.patch.object(self.engine, "_execute_single_intent", side_effect=self.fake_single_intent):
+            return self.engine._execute_intent(intent)
+
+    def test_parts_run_in_order_and_merge(self):
+        data, summary = self.execute({
+            "domain": "inventory",
+            "sub_intents": [{"domain": "work_orders", "filters": {"status": "released"}}],
+        })
+
+        self.assertEqual([c["domain"] for c in self.calls], ["inventory", "work_orders"])
+        self.assertTrue(all("sub_intents" not in c for c in self.calls))
+        self.assertEqual(data, {"inventory": [1], "kpis": {"part": 1}, "work_orders": [2], "kpis_2": {"part": 2}})
+        self.assertEqual(summary, "inventory #1. work_orders #2.")
+
+    def test_repeated_keys_get_numbered_suffixes(self):
+        data, _ = self.execute({
+            "domain": "production",
+            "sub_intents": [{"domain": "production"}, {"domain": "production"}],
+        })
+
+        self.assertEqual(data["production"], [1])
+        self.assertEqual(data["production_2"], [2])
+        self.assertEqual(data["production_3"], [3])
+        self.assertEqual([data["kpis"], data["kpis_2"], data["kpis_3"]], [{"part": 1}, {"part": 2}, {"part": 3}])
+
+    def test_parts_are_capped(self):
+        sub_intents = [{"domain": "products"} for _ in range(MAX_SUB_INTENTS + 3)]
+        data, _ = self.execute({"domain": "products", "sub_intents": sub_intents})
+
+        self.assertEqual(len(self.calls), MAX_SUB_INTENTS)
+        self.assertEqual(len([k for k in data if k.startswith("products")]), MAX_SUB_INTENTS)
+
+    def test_sub_intents_without_a_domain_are_ignored(self):
+        data, _ = self.execute({"domain": "finance", "sub_intents": [{}, "inventory", {"domain": ""}]})
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(data, {"finance": [1], "kpis": {"part": 1}})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VersionedETagTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        tenant = SimpleNamespace(id=7)
+        patcher = mock.patch.object(business_views, 'get_current_tenant', return_value=tenant)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_summary(self, **headers):
+        request = self.factory.get('/financial-summary/', {'start_date': '2024-06-01', 'end_date': '2024-06-30'}, **headers)
+        force_authenticate(request, user=SimpleNamespace(is_authenticated=True))
+        return business_views.financial_summary(request)
+
+    def test_matching_poll_gets_304_without_running_queries(self):
+        with mock.patch.object(business_views, 'generate_financial_summary', return_value={'net_profit': 1}) as build:
+            first = self.get_summary()
+            etag = first['ETag']
+            second = self.get_summary(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], etag)
+        build.assert_called_once()
+
+    def test_version_bump_changes_the_etag(self):
+        with mock.patch.object(business_views, 'generate_financial_summary', return_value={'net_profit': 1}) as build:
+            etag = self.get_summary()['ETag']
+            cache.incr('analysis_version:7')
+            response = self.get_summary(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(build.call_count, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SemanticIntentCacheTests(SimpleTestCase):
+    """Every query embeds to the same vector, so only cacheability and tenant decide a hit"""
+
+    def setUp(self):
+        cache.clear()
+        self.llm_intents = []
+        patches = [
+            mock.patch.object(enhanced_ai_engine, '_semantic_cache', enhanced_ai_engine._SemanticIntentCache(100)),
+            mock.patch.object(enhanced_ai_engine, '_recent_intents', enhanced_ai_engine._RecentIntents(100)),
+            mock.patch.object(enhanced_ai_engine, '_embed_query', return_value=np.array([1.0, 0.0, 0.0], dtype=np.float32)),
+            mock.patch.object(enhanced_ai_engine, 'call_llm', side_effect=lambda *a, **k: self.llm_intents.pop(0)),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def understand(self, tenant_id, query, llm_intent):
+        self.llm_intents = [llm_intent]
+        intent = ERPAIEngine(SimpleNamespace(id=tenant_id), None)._llm_understand(query)
+        return intent, not self.llm_intents  # (intent, whether the LLM was asked)
+
+    def test_generic_intent_is_reused_within_the_tenant_only(self):
+        listing = {"domain": "products", "action": "list"}
+        self.assertEqual(self.understand(1, "show all products", listing), (listing, True))
+        self.assertEqual(self.understand(1, "list every product", {"domain": "parties"}), (listing, False))
+
+        other = {"domain": "products", "action": "summary"}
+        self.assertEqual(self.understand(2, "list every product", other), (other, True))
+
+    def test_different_preset_is_not_reused(self):
+        last_month = {"domain": "finance", "date_range": {"preset": "last_month"}}
+        this_month = {"domain": "finance", "date_range": {"preset": "this_month"}}
+        self.understand(1, "revenue last month", last_month)
+        self.assertEqual(self.understand(1, "revenue this month", this_month), (this_month, True))
+
+    def test_different_status_filter_is_not_reused(self):
+        released = {"domain": "work_orders", "filters": {"status": "released"}}
+        planned = {"domain": "work_orders", "filters": {"status": "planned"}}
+        self.understand(1, "released work orders", released)
+        self.assertEqual(self.understand(1, "planned work orders", planned), (planned, True))
+
+    def test_different_entity_is_not_reused(self):
+        brackets = {"domain": "inventory", "filters": {"text": "bracket"}}
+        bolts = {"domain": "inventory", "filters": {"text": "bolt"}}
+        self.understand(1, "stock of bracket", brackets)
+        self.assertEqual(self.understand(1, "stock of bolt", bolts), (bolts, True))
+
+    def test_sub_intent_slots_count(self):
+        compound = {"domain": "products", "sub_intents": [{"domain": "work_orders", "filters": {"status": "planned"}}]}
+        self.assertFalse(enhanced_ai_engine._semantic_cacheable(compound))
+        self.assertTrue(enhanced_ai_engine._semantic_cacheable({"domain": "products", "filters": {}, "date_range": {}}))
+
+    def test_lookup_returns_a_private_copy(self):
+        store = enhanced_ai_engine._SemanticIntentCache(10)
+        vector = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+        store.add(1, vector, {"domain": "products", "metrics": []})
+
+        hit = store.lookup(1, vector, 0.9)
+        hit["metrics"].append("stock_value")
+        hit["domain"] = "finance"
+
+        self.assertEqual(store.lookup(1, vector, 0.9), {"domain": "products", "metrics": []})
+        self.assertIsNone(store.lookup(2, vector, 0.9))
+
+
+class RecentIntentsTests(SimpleTestCase):
+
+    def test_same_query_is_kept_apart_per_tenant(self):
+        recent = enhanced_ai_engine._RecentIntents(10)
+        recent.put((1, "open work orders"), {"domain": "work_orders", "filters": {"status": "released"}})
+        recent.put((2, "open work orders"), {"domain": "work_orders", "filters": {"status": "in_progress"}})
+
+        self.assertEqual(recent.get((1, "open work orders"))["filters"], {"status": "released"})
+        self.assertEqual(recent.get((2, "open work orders"))["filters"], {"status": "in_progress"})
+        self.assertIsNone(recent.get((3, "open work orders")))
+
+    def test_get_returns_a_private_copy(self):
+        recent = enhanced_ai_engine._RecentIntents(10)
+        recent.put((1, "stock"), {"domain": "inventory", "filters": {}})
+
+        first = recent.get((1, "stock"))
+        first["filters"]["text"] = "bolt"
+        first["domain"] = "products"
+
+        self.assertEqual(recent.get((1, "stock")), {"domain": "inventory", "filters": {}})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        recent = enhanced_ai_engine._RecentIntents(2)
+        recent.put((1, "a"), {"domain": "products"})
+        recent.put((1, "b"), {"domain": "inventory"})
+        recent.get((1, "a"))
+        recent.put((1, "c"), {"domain": "finance"})
+
+        self.assertIsNone(recent.get((1, "b")))
+        self.assertEqual(recent.get((1, "a")), {"domain": "products"})
+
+    def test_entries_expire_with_the_shared_cache_ttl(self):
+        recent = enhanced_ai_engine._RecentIntents(10)
+        self.assertEqual(recent.ttl, enhanced_ai_engine.INTENT_CACHE_TTL)
+        with mock.patch.object(enhanced_ai_engine, 'monotonic', return_value=1000.0):
+            recent.put((1, "stock"), {"domain": "inventory"})
+        with mock.patch.object(enhanced_ai_engine, 'monotonic', return_value=1000.0 + recent.ttl - 1):
+            self.assertEqual(recent.get((1, "stock")), {"domain": "inventory"})
+        with mock.patch.object(enhanced_ai_engine, 'monotonic', return_value=1000.0 + recent.ttl):
+            self.assertIsNone(recent.get((1, "stock")))
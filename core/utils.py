@@ -1,11 +1,19 @@
 # core/utils.py - ERP Utility Functions
 
-from django.db.models import Sum, Avg, Q
+from django.db.models import Sum, Avg, Count, F, Q
+from django.db.models.functions import Abs
+from django.db import connections, transaction
 from django.utils import timezone
 from django.core.cache import cache  # Add this import
-from datetime import datetime, timedelta
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+import atexit
+import queue
+import threading
+from time import monotonic
+from datetime import datetime, time, timedelta
 from decimal import Decimal
-from .models import GLJournal, GLJournalLine, ChartOfAccounts, WorkOrder, ProductionEntry, StockMovement, GLJournalArchive, GLJournalLineArchive
+from .models import GLJournal, GLJournalLine, ChartOfAccounts, WorkOrder, ProductionEntry, StockMovement, GLJournalArchive, GLJournalLineArchive, AIQueryLog, Product, Equipment, Employee, CostCenter
 import logging
 from .llm_utils import call_llm
 from reportlab.lib.pagesizes import A4
@@ -21,6 +29,15 @@ matplotlib.use('Agg')
 
 logger = logging.getLogger(__name__)
 
+def datetime_span(field, start_date, end_date):
+    """
+    Filter kwargs covering the local days start_date..end_date on a DateTimeField.
+    Unlike field__date__range this compares the raw column, so its index can be used.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return {f'{field}__gte': start, f'{field}__lt': end}
+
 def generate_movement_number(tenant, movement_type):
     """Generate unique movement numbers"""
     from .models import StockMovement
@@ -55,17 +72,9 @@ def generate_movement_number(tenant, movement_type):
     
     return f"{prefix}-{date_part}-{next_seq:04d}"
     
-def calculate_oee(equipment, date_filter):
-    """Calculate Overall Equipment Effectiveness (OEE) for a specific date"""
-    from .models import ProductionEntry
-    
-    # Get production entries for the equipment on specified date
-    entries = ProductionEntry.objects.filter(
-        equipment=equipment,
-        entry_datetime__date=date_filter
-    )
-    
-    if not entries.exists():
+def _oee_metrics(capacity_per_hour, total_entries, total_downtime_minutes, total_produced, total_rejected):
+    """OEE breakdown from aggregated production totals (one entry = one hour)"""
+    if not total_entries:
         return {
             'oee': 0,
             'availability': 0,
@@ -77,18 +86,12 @@ def calculate_oee(equipment, date_filter):
             'total_rejected': 0
         }
     
-    # Calculate metrics
-    total_entries = entries.count()
-    total_downtime_minutes = entries.aggregate(Sum('downtime_minutes'))['downtime_minutes__sum'] or 0
-    total_produced = entries.aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
-    total_rejected = entries.aggregate(Sum('quantity_rejected'))['quantity_rejected__sum'] or 0
-    
     # Availability = (Total Time - Downtime) / Total Time
     total_minutes = total_entries * 60  # Assuming 1-hour entries
     availability = ((total_minutes - total_downtime_minutes) / max(total_minutes, 1)) * 100
     
     # Performance = Actual Output / Theoretical Capacity
-    theoretical_capacity = equipment.capacity_per_hour * total_entries
+    theoretical_capacity = capacity_per_hour * total_entries
     performance = (total_produced / max(theoretical_capacity, 1)) * 100 if theoretical_capacity > 0 else 0
     
     # Quality = Good Parts / Total Parts
@@ -108,7 +111,117 @@ def calculate_oee(equipment, date_filter):
         'total_produced': total_produced,
         'total_rejected': total_rejected
     }
+
+def calculate_oee(equipment, date_filter):
+    """Calculate Overall Equipment Effectiveness (OEE) for a specific date"""
+    from .models import ProductionEntry
+    
+    # Get production entries for the equipment on specified date
+    totals = ProductionEntry.objects.filter(
+        equipment=equipment,
+        entry_datetime__date=date_filter
+    ).aggregate(
+        entries=Count('id'),
+        downtime=Sum('downtime_minutes'),
+        produced=Sum('quantity_produced'),
+        rejected=Sum('quantity_rejected')
+    )
+    
+    return _oee_metrics(
+        equipment.capacity_per_hour,
+        totals['entries'],
+        totals['downtime'] or 0,
+        totals['produced'] or 0,
+        totals['rejected'] or 0
+    )
+
+def calculate_oee_bulk(equipment_list, start_date, end_date):
+    """
+    OEE for every (equipment, day) in the range from one grouped query.
+    Returns {(equipment_id, date): metrics}; days without entries get zeroed metrics.
+    """
+    from .models import ProductionEntry
+    
+    capacity = {eq.id: eq.capacity_per_hour for eq in equipment_list}
+    rows = ProductionEntry.objects.filter(
+        equipment__in=list(capacity),
+        **datetime_span('entry_datetime', start_date, end_date)
+    ).values('equipment_id', 'entry_datetime__date').annotate(
+        entries=Count('id'),
+        downtime=Sum('downtime_minutes'),
+        produced=Sum('quantity_produced'),
+        rejected=Sum('quantity_rejected')
+    )
+    
+    results = {
+        (row['equipment_id'], row['entry_datetime__date']): _oee_metrics(
+            capacity[row['equipment_id']],
+            row['entries'],
+            row['downtime'] or 0,
+            row['produced'] or 0,
+            row['rejected'] or 0
+        )
+        for row in rows
+    }
     
+    empty = _oee_metrics(0, 0, 0, 0, 0)
+    day = start_date
+    while day <= end_date:
+        for equipment_id in capacity:
+            results.setdefault((equipment_id, day), empty)
+        day += timedelta(days=1)
+    return results
+    
+INVENTORY_VALUATION_CACHE_TTL = 300
+
+def _bump_cache_version_on_commit(version_key):
+    """Bump a cache version once the write is committed, so readers can't cache pre-commit data under the new version"""
+    def bump():
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            pass  # No version yet means nothing has been cached
+    transaction.on_commit(bump)
+
+def stock_cache_version(tenant_id):
+    """Current stock data version for the tenant; bumps on stock/product changes"""
+    return cache.get_or_set(f"inv_val_version:{tenant_id}", 1, None)
+
+def inventory_valuation_cache_key(tenant_id, valuation_date):
+    """Cache key for an inventory_valuation response"""
+    return f"inv_val:{tenant_id}:{stock_cache_version(tenant_id)}:{valuation_date.isoformat()}"
+
+@receiver(post_save, sender=StockMovement)
+@receiver(post_delete, sender=StockMovement)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_inventory_valuation(sender, instance, **kwargs):
+    """Retire every cached valuation for the tenant without needing delete_pattern"""
+    _bump_cache_version_on_commit(f"inv_val_version:{instance.tenant_id}")
+
+ANALYSIS_CACHE_TTL = 120
+
+def analysis_cache_key(view_name, tenant_id, start_date, end_date):
+    """Cache key for a date-ranged analysis response; the version bumps on production/GL changes"""
+    version = cache.get_or_set(f"analysis_version:{tenant_id}", 1, None)
+    return f"{view_name}:{tenant_id}:{version}:{start_date.isoformat()}:{end_date.isoformat()}"
+
+@receiver(post_save, sender=ProductionEntry)
+@receiver(post_delete, sender=ProductionEntry)
+@receiver(post_save, sender=WorkOrder)
+@receiver(post_delete, sender=WorkOrder)
+@receiver(post_save, sender=GLJournalLine)
+@receiver(post_delete, sender=GLJournalLine)
+@receiver(post_save, sender=GLJournal)  # bulk-created lines send no signals of their own
+@receiver(post_save, sender=Equipment)  # capacity_analysis, KPIs
+@receiver(post_delete, sender=Equipment)
+@receiver(post_save, sender=Employee)  # cost_center_analysis
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=CostCenter)
+@receiver(post_delete, sender=CostCenter)
+def invalidate_analysis_cache(sender, instance, **kwargs):
+    _bump_cache_version_on_commit(f"analysis_version:{instance.tenant_id}")
+
 def calculate_inventory_valuation(tenant, valuation_date=None):
     from .models import Product, StockMovement
     from decimal import Decimal
@@ -116,32 +229,34 @@ def calculate_inventory_valuation(tenant, valuation_date=None):
         valuation_date = timezone.now().date()
     
     valuation_data = {}
-    products = Product.objects.filter(tenant=tenant, is_active=True)
+    products = list(Product.objects.filter(tenant=tenant, is_active=True).only(
+        'id', 'sku', 'product_name', 'category', 'reorder_point'
+    ))
+    
+    # Running (qty, value) per product, filled from one ordered pass over all movements
+    running = {product.id: (Decimal('0'), Decimal('0')) for product in products}
+    movements = StockMovement.objects.filter(
+        tenant=tenant,
+        product__is_active=True,
+        movement_date__date__lte=valuation_date
+    ).order_by('product_id', 'movement_date', 'id').values_list(
+        'product_id', 'movement_type', 'quantity', 'unit_cost'
+    )
+    
+    for product_id, movement_type, quantity, unit_cost in movements.iterator(chunk_size=2000):
+        running_qty, running_value = running.get(product_id, (Decimal('0'), Decimal('0')))
+        if movement_type in ['receipt', 'production_receipt', 'transfer_in', 'adjustment']:  # Inflows
+            running_qty += quantity
+            running_value += quantity * unit_cost
+        else:  # Outflows
+            if running_qty >= quantity:
+                outflow_value = quantity * (running_value / running_qty if running_qty > 0 else 0)
+                running_qty -= quantity
+                running_value -= outflow_value
+        running[product_id] = (running_qty, running_value)
     
     for product in products:
-        movements = StockMovement.objects.filter(
-            tenant=tenant,
-            product=product,
-            movement_date__date__lte=valuation_date
-        ).order_by('movement_date')
-        
-        running_qty = Decimal('0')
-        running_value = Decimal('0')
-        
-        for movement in movements:
-            if movement.movement_type in ['receipt', 'production_receipt', 'transfer_in', 'adjustment']:  # Inflows
-                new_qty = running_qty + movement.quantity
-                new_value = running_value + (movement.quantity * movement.unit_cost)
-                if new_qty > 0:
-                    unit_cost = new_value / new_qty
-                running_qty = new_qty
-                running_value = new_value
-            else:  # Outflows
-                if running_qty >= movement.quantity:
-                    outflow_value = movement.quantity * (running_value / running_qty if running_qty > 0 else 0)
-                    running_qty -= movement.quantity
-                    running_value -= outflow_value
-        
+        running_qty, running_value = running[product.id]
         valuation_data[product.sku] = {
             'product_name': product.product_name,
             'category': product.category or 'Uncategorized',
@@ -154,29 +269,38 @@ def calculate_inventory_valuation(tenant, valuation_date=None):
     total_value = sum(data['total_value'] for data in valuation_data.values())
     return {'total_inventory_value': total_value, 'details': valuation_data}
 
+def cached_inventory_valuation(tenant, valuation_date=None):
+    """calculate_inventory_valuation shared across views and dashboard helpers until stock/products change"""
+    if not valuation_date:
+        valuation_date = timezone.now().date()
+    cache_key = f"{inventory_valuation_cache_key(tenant.id, valuation_date)}:raw"
+    valuation = cache.get(cache_key)
+    if valuation is None:
+        valuation = calculate_inventory_valuation(tenant, valuation_date)
+        cache.set(cache_key, valuation, INVENTORY_VALUATION_CACHE_TTL)
+    return valuation
+
 def calculate_material_consumption(work_order):
     """Calculate actual material consumption vs standard"""
     from .models import StockMovement
     
-    # Get all production issues for this work order
+    # Get all production issues for this work order, summed per product in SQL
     material_issues = StockMovement.objects.filter(
         tenant=work_order.tenant,
         movement_type='production_issue',
         reference_doc=work_order.wo_number
+    ).values('product__sku', 'product__product_name').annotate(
+        consumed=Sum(Abs('quantity')),
+        cost=Sum(Abs('quantity') * F('unit_cost'))
     )
     
     consumption_data = {}
     for issue in material_issues:
-        sku = issue.product.sku
-        if sku not in consumption_data:
-            consumption_data[sku] = {
-                'product_name': issue.product.product_name,
-                'actual_consumed': 0,
-                'total_cost': 0
-            }
-        
-        consumption_data[sku]['actual_consumed'] += float(abs(issue.quantity))
-        consumption_data[sku]['total_cost'] += float(abs(issue.quantity) * issue.unit_cost)
+        consumption_data[issue['product__sku']] = {
+            'product_name': issue['product__product_name'],
+            'actual_consumed': float(issue['consumed'] or 0),
+            'total_cost': float(issue['cost'] or 0)
+        }
     
     return consumption_data
 
@@ -194,7 +318,7 @@ def get_production_efficiency_trends(tenant, days=7):
         
         day_entries = ProductionEntry.objects.filter(
             tenant=tenant,
-            entry_datetime__date=current_date
+            **datetime_span('entry_datetime', current_date, current_date)
         )
         
         daily_production = day_entries.aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
@@ -392,25 +516,22 @@ def calculate_cost_center_performance(cost_center, period_start, period_end):
     )
     
     # Calculate costs (expenses and COGS)
-    total_costs = 0
-    for entry in gl_entries:
-        if entry.account.account_type in ['expense', 'cogs']:
-            total_costs += float(entry.debit_amount - entry.credit_amount)
+    total_costs = float(gl_entries.filter(
+        account__account_type__in=['expense', 'cogs']
+    ).aggregate(total=Sum(F('debit_amount') - F('credit_amount')))['total'] or 0)
     
     # Get employees in this cost center
     employees = Employee.objects.filter(
         cost_center=cost_center,
         is_active=True
     )
+    employee_count = employees.count()
     
     # Calculate production output from this cost center
-    total_production = 0
-    for employee in employees:
-        production = ProductionEntry.objects.filter(
-            operator=employee,
-            entry_datetime__date__range=[period_start, period_end]
-        ).aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
-        total_production += production
+    total_production = ProductionEntry.objects.filter(
+        operator__in=employees,
+        **datetime_span('entry_datetime', period_start, period_end)
+    ).aggregate(Sum('quantity_produced'))['quantity_produced__sum'] or 0
     
     # Calculate metrics
     cost_per_unit = total_costs / max(total_production, 1) if total_production > 0 else 0
@@ -422,8 +543,8 @@ def calculate_cost_center_performance(cost_center, period_start, period_end):
         'total_costs': total_costs,
         'total_production': total_production,
         'cost_per_unit': round(cost_per_unit, 4),
-        'employee_count': employees.count(),
-        'avg_cost_per_employee': total_costs / max(employees.count(), 1)
+        'employee_count': employee_count,
+        'avg_cost_per_employee': total_costs / max(employee_count, 1)
     }
 
 # Add this updated function to your utils.py file
@@ -447,14 +568,14 @@ def detect_production_anomalies(tenant, lookback_days=30):  # Changed default fr
         baseline_entries = ProductionEntry.objects.filter(
             tenant=tenant,
             equipment=equipment,
-            entry_datetime__date__range=[baseline_start, baseline_end]
+            **datetime_span('entry_datetime', baseline_start, baseline_end)
         )
         
         # Get recent production data
         entries = ProductionEntry.objects.filter(
             tenant=tenant,
             equipment=equipment,
-            entry_datetime__date__range=[start_date, end_date]
+            **datetime_span('entry_datetime', start_date, end_date)
         )
         
         if baseline_entries.count() < 3 or entries.count() == 0:  # Need minimum data points
@@ -530,14 +651,14 @@ def detect_production_anomalies_with_range(tenant, start_date, end_date):
         baseline_entries = ProductionEntry.objects.filter(
             tenant=tenant,
             equipment=equipment,
-            entry_datetime__date__range=[baseline_start, baseline_end]
+            **datetime_span('entry_datetime', baseline_start, baseline_end)
         )
         
         # Get current period data
         current_entries = ProductionEntry.objects.filter(
             tenant=tenant,
             equipment=equipment,
-            entry_datetime__date__range=[start_date, end_date]
+            **datetime_span('entry_datetime', start_date, end_date)
         )
         
         if baseline_entries.count() < 3:  # Need minimum baseline data
@@ -685,43 +806,45 @@ def create_automated_gl_entry(tenant, entry_type, reference_data, user=None):
                 }
             )
 
-            # Create journal header
-            journal_number = generate_journal_number(tenant)
-            journal = GLJournal.objects.create(
-                tenant=tenant,
-                journal_number=journal_number,
-                posting_date=timezone.now().date(),
-                reference=f"Production Completion - {work_order.wo_number}",
-                narration=f"Completed {work_order.quantity_completed} units of {work_order.product.sku}",
-                total_debit=production_value,
-                total_credit=production_value,
-                status='posted',  # Directly posted
-                created_by=user
-            )
-
-            # Dr Inventory (Finished Goods)
-            GLJournalLine.objects.create(
-                tenant=tenant,
-                journal=journal,
-                line_number=1,
-                account=inventory_account,
-                cost_center=work_order.cost_center,
-                debit_amount=production_value,
-                description=f"Finished goods received: {work_order.product.sku}",
-                created_by=user
-            )
+            # Header and both lines commit together; lines go in one INSERT
+            with transaction.atomic():
+                journal_number = generate_journal_number(tenant)
+                journal = GLJournal.objects.create(
+                    tenant=tenant,
+                    journal_number=journal_number,
+                    posting_date=timezone.now().date(),
+                    reference=f"Production Completion - {work_order.wo_number}",
+                    narration=f"Completed {work_order.quantity_completed} units of {work_order.product.sku}",
+                    total_debit=production_value,
+                    total_credit=production_value,
+                    status='posted',  # Directly posted
+                    created_by=user
+                )
 
-            # Cr Cash
-            GLJournalLine.objects.create(
-                tenant=tenant,
-                journal=journal,
-                line_number=2,
-                account=cash_account,
-                cost_center=work_order.cost_center,
-                credit_amount=production_value,
-                description=f"Cash spent for production: {work_order.product.sku}",
-                created_by=user
-            )
+                GLJournalLine.objects.bulk_create([
+                    # Dr Inventory (Finished Goods)
+                    GLJournalLine(
+                        tenant=tenant,
+                        journal=journal,
+                        line_number=1,
+                        account=inventory_account,
+                        cost_center=work_order.cost_center,
+                        debit_amount=production_value,
+                        description=f"Finished goods received: {work_order.product.sku}",
+                        created_by=user
+                    ),
+                    # Cr Cash
+                    GLJournalLine(
+                        tenant=tenant,
+                        journal=journal,
+                        line_number=2,
+                        account=cash_account,
+                        cost_center=work_order.cost_center,
+                        credit_amount=production_value,
+                        description=f"Cash spent for production: {work_order.product.sku}",
+                        created_by=user
+                    ),
+                ], batch_size=500)
 
             journal_numbers.append(journal_number)
 
@@ -735,6 +858,81 @@ def generate_journal_number(tenant):
     count = GLJournal.objects.filter(tenant=tenant).count()
     return f"GL-{timezone.now().strftime('%Y%m')}-{(count + 1):04d}"
 
+_ai_log_queue = queue.Queue(maxsize=1000)
+_ai_log_writer = None
+_ai_log_writer_lock = threading.Lock()
+# Held from taking a batch off the queue until it is written, so the exit flush can wait it out
+_ai_log_batch_lock = threading.Lock()
+_ai_log_stopping = threading.Event()
+AI_LOG_FLUSH_INTERVAL = 0.5
+AI_LOG_BATCH_SIZE = 500
+
+
+def _write_ai_query_logs(batch):
+    try:
+        AIQueryLog.objects.bulk_create([AIQueryLog(**fields) for fields in batch], batch_size=AI_LOG_BATCH_SIZE)
+    except Exception as e:
+        logger.warning(f"Failed to write {len(batch)} AI query log(s): {e}")
+    finally:
+        connections.close_all()
+
+
+def _next_ai_query_log_batch():
+    """Rows queued within 500ms of the first one (up to AI_LOG_BATCH_SIZE); [] if nothing arrives for 500ms"""
+    try:
+        batch = [_ai_log_queue.get(timeout=AI_LOG_FLUSH_INTERVAL)]
+    except queue.Empty:
+        return []
+    deadline = monotonic() + AI_LOG_FLUSH_INTERVAL
+    while len(batch) < AI_LOG_BATCH_SIZE:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_ai_log_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _drain_ai_query_logs():
+    """Background writer: each batch goes out in one INSERT at most 500ms after its first row arrives"""
+    while not _ai_log_stopping.is_set():
+        with _ai_log_batch_lock:
+            batch = _next_ai_query_log_batch()
+            if batch:
+                _write_ai_query_logs(batch)
+
+
+@atexit.register
+def _flush_ai_query_logs():
+    """Write everything still pending when the worker exits (the writer thread is a daemon)"""
+    _ai_log_stopping.set()
+    with _ai_log_batch_lock:  # the writer finishes any batch it already took off the queue
+        batch = []
+        try:
+            while True:
+                batch.append(_ai_log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            _write_ai_query_logs(batch)
+
+
+def log_ai_query(**fields):
+    """Queue an AIQueryLog write off the request path; falls back to a direct insert when the queue is full"""
+    global _ai_log_writer
+    if _ai_log_writer is None:
+        with _ai_log_writer_lock:
+            if _ai_log_writer is None:
+                _ai_log_writer = threading.Thread(target=_drain_ai_query_logs, name='ai-query-log', daemon=True)
+                _ai_log_writer.start()
+    try:
+        _ai_log_queue.put_nowait(fields)
+    except queue.Full:
+        AIQueryLog.objects.create(**fields)
+
+
 def get_dashboard_alerts(tenant):
     """Generate real-time business alerts"""
     alerts = []
@@ -796,7 +994,7 @@ def generate_weekly_report_pdf(tenant, start_date, end_date):
     
     # Production Summary
     production_data = ProductionEntry.objects.filter(
-        tenant=tenant, entry_datetime__date__range=[start_date, end_date]
+        tenant=tenant, **datetime_span('entry_datetime', start_date, end_date)
     ).aggregate(
         total_produced=Sum('quantity_produced'),
         total_rejected=Sum('quantity_rejected'),
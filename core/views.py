@@ -30,13 +30,12 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
-from .models import AIQueryLog
 import json
 from django.views.decorators.csrf import csrf_exempt
 import time  # For execution timing
 import logging
 from .middleware import get_current_tenant
-from .utils import calculate_oee, generate_movement_number, create_automated_gl_entry
+from .utils import calculate_oee, generate_movement_number, create_automated_gl_entry, log_ai_query
 from django.conf import settings
 from .llm_utils import call_llm
 # Add this import at the top of views.py
@@ -1777,7 +1776,7 @@ class AIQueryView(APIView):
             
             # Log query for analytics
             try:
-                AIQueryLog.objects.create(
+                log_ai_query(
                     tenant=tenant,
                     user_query=query,
                     was_successful=result.get('success', False),
@@ -1794,7 +1793,7 @@ class AIQueryView(APIView):
             
             # Log failed query
             try:
-                AIQueryLog.objects.create(
+                log_ai_query(
                     tenant=tenant,
                     user_query=query,
                     was_successful=False,
@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',    
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'core.middleware.TenantMiddleware',
+    'core.middleware.RequestClockMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +93,15 @@ DATABASES = {
     },
 }
 
+# Shared cache: every gunicorn worker must see the same version counters and cached responses
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config('REDIS_URL', default='redis://localhost:6379/0'),
+        "KEY_PREFIX": "erp",
+    }
+}
+
 
 AI_SETTINGS = {
     'GROQ_API_KEY': os.getenv('GROQ_API_KEY', ''),
@@ -98,6 +109,8 @@ AI_SETTINGS = {
     'DEFAULT_MODEL': 'llama-3.1-8b-instant',
     'MAX_TOKENS': 512,
     'TEMPERATURE': 0.3,
+    # Reuse parsed intents for near-duplicate questions; needs sentence-transformers, model loads at startup
+    'SEMANTIC_CACHE_ENABLED': config('AI_SEMANTIC_CACHE_ENABLED', default=False, cast=bool),
 }
 
 # For correct behaviour behind proxies
@@ -144,6 +157,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # JWT Settings